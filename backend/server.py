@@ -1,13 +1,22 @@
-from fastapi import FastAPI, APIRouter, Depends, HTTPException, status
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional
+from typing import Awaitable, Callable, Dict, List, Optional
+from collections import deque
+import asyncio
+import math
+import socket
+import time
 import uuid
 from datetime import datetime, timezone, timedelta
 import jwt
@@ -25,6 +34,8 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+DEFAULT_BRANCH_ID = os.environ.get('DEFAULT_BRANCH_ID', 'MATRIZ')
+
 # Security
 security = HTTPBearer()
 SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
@@ -67,6 +78,36 @@ class AidRequestStatus(str, Enum):
     APROBADA = "APROBADA"
     RECHAZADA = "RECHAZADA"
 
+class ReportType(str, Enum):
+    AHORROS_POR_TIPO_CUENTA = "AHORROS_POR_TIPO_CUENTA"
+    TRANSACCIONES_POR_CAJERO = "TRANSACCIONES_POR_CAJERO"
+    SOCIOS_NUEVOS_POR_MES = "SOCIOS_NUEVOS_POR_MES"
+
+class ReportJobStatus(str, Enum):
+    PENDIENTE = "PENDIENTE"
+    EN_PROCESO = "EN_PROCESO"
+    COMPLETADO = "COMPLETADO"
+    FALLIDO = "FALLIDO"
+
+class EventType(str, Enum):
+    ACCOUNT_BALANCE_CHANGED = "ACCOUNT_BALANCE_CHANGED"
+    ACCOUNT_UPDATED = "ACCOUNT_UPDATED"
+    MEMBER_UPDATED = "MEMBER_UPDATED"
+    USER_UPDATED = "USER_UPDATED"
+    USER_DEACTIVATED = "USER_DEACTIVATED"
+    TRANSACTION_CREATED = "TRANSACTION_CREATED"
+
+class SyncOperationType(str, Enum):
+    SOCIO = "SOCIO"
+    DEPOSITO = "DEPOSITO"
+    RETIRO = "RETIRO"
+    APORTE_MUTUA = "APORTE_MUTUA"
+
+class SyncStatus(str, Enum):
+    APLICADA = "APLICADA"
+    DUPLICADA = "DUPLICADA"
+    CONFLICTO = "CONFLICTO"
+
 class NotificationStatus(str, Enum):
     NO_LEIDA = "NO_LEIDA"
     LEIDA = "LEIDA"
@@ -79,12 +120,24 @@ class NotificationType(str, Enum):
     SOCIO = "SOCIO"
 
 # Models
+class Branch(BaseModel):
+    id: str
+    name: str
+    is_active: bool = True
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class BranchCreate(BaseModel):
+    id: str = Field(pattern=r"^[A-Z0-9]{2,10}$")
+    name: str
+
 class User(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     username: str
     email: EmailStr
     full_name: str
     role: UserRole
+    # None means cooperative-wide access (administrators)
+    branch_id: Optional[str] = None
     is_active: bool = True
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -94,6 +147,7 @@ class UserCreate(BaseModel):
     password: str
     full_name: str
     role: UserRole
+    branch_id: Optional[str] = None
 
 class UserLogin(BaseModel):
     username: str
@@ -114,6 +168,7 @@ class Member(BaseModel):
     phone: str
     address: str
     birth_date: datetime
+    branch_id: str
     status: MemberStatus = MemberStatus.ACTIVO
     registration_date: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     documents: List[str] = []
@@ -126,11 +181,13 @@ class MemberCreate(BaseModel):
     phone: str
     address: str
     birth_date: datetime
+    branch_id: Optional[str] = None
 
 class Account(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     account_number: str
     member_id: str
+    branch_id: str
     account_type: AccountType
     balance: float = 0.0
     is_blocked: bool = False
@@ -147,19 +204,74 @@ class Transaction(BaseModel):
     reference: str
     account_id: str
     member_id: str
+    branch_id: str
     transaction_type: TransactionType
     amount: float
     balance_before: float
     balance_after: float
     description: str
     created_by: str
+    transfer_id: Optional[str] = None
+    schedule_id: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class TransactionCreate(BaseModel):
     account_id: str
     transaction_type: TransactionType
+    amount: float = Field(gt=0, allow_inf_nan=False)
+    description: Optional[str] = ""
+
+class TransferCreate(BaseModel):
+    from_account_id: str
+    to_account_id: str
+    amount: float = Field(gt=0, allow_inf_nan=False)
+    description: Optional[str] = ""
+
+class Transfer(BaseModel):
+    id: str
+    member_id: str
     amount: float
+    debit: Transaction
+    credit: Transaction
+
+class SyncOperation(BaseModel):
+    client_op_id: str
+    client_timestamp: datetime
+    op_type: SyncOperationType
+    account_id: Optional[str] = None
+    member_id: Optional[str] = None
+    amount: Optional[float] = None
     description: Optional[str] = ""
+    member: Optional[MemberCreate] = None
+
+class SyncBatch(BaseModel):
+    terminal_id: str
+    operations: List[SyncOperation]
+
+class SyncResult(BaseModel):
+    client_op_id: str
+    status: SyncStatus
+    entity_id: Optional[str] = None
+    reference: Optional[str] = None
+    detail: Optional[str] = None
+
+class DepositSchedule(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    account_id: str
+    member_id: str
+    branch_id: str
+    amount: float
+    day_of_month: int
+    next_run_date: datetime
+    is_active: bool = True
+    last_run_at: Optional[datetime] = None
+    created_by: str
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class DepositScheduleCreate(BaseModel):
+    account_id: str
+    amount: float = Field(gt=0, allow_inf_nan=False)
+    day_of_month: int = Field(ge=1, le=28)
 
 class MutualAidContribution(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -185,6 +297,32 @@ class AidRequestCreate(BaseModel):
     amount: float
     reason: str
 
+class ReportJobCreate(BaseModel):
+    report_type: ReportType
+    branch_id: Optional[str] = None
+    date_from: Optional[datetime] = None
+    date_to: Optional[datetime] = None
+
+class ReportJob(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    report_type: ReportType
+    branch_id: Optional[str] = None
+    date_from: Optional[datetime] = None
+    date_to: Optional[datetime] = None
+    params_hash: str
+    status: ReportJobStatus = ReportJobStatus.PENDIENTE
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    cached: bool = False
+    requested_by: str
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class AidRequestBulkDecision(BaseModel):
+    request_ids: List[str]
+    notes: Optional[str] = None
+
 class AuditLog(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
@@ -212,6 +350,13 @@ class NotificationCreate(BaseModel):
     message: str
     notification_type: NotificationType
 
+class ChangeEvent(BaseModel):
+    event_type: EventType
+    entity_id: str
+    branch_id: Optional[str] = None
+    data: dict = {}
+    occurred_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
 # Utility functions
 def verify_password(plain_password, hashed_password):
     # Using SHA-256 with salt for password verification
@@ -254,7 +399,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         raise credentials_exception
     return User(**user)
 
-async def log_action(user_id: str, action: str, entity_type: str, entity_id: str, old_data=None, new_data=None, ip_address="127.0.0.1"):
+async def log_action(user_id: str, action: str, entity_type: str, entity_id: str, old_data=None, new_data=None, ip_address="127.0.0.1", session=None):
     log_entry = AuditLog(
         user_id=user_id,
         action=action,
@@ -264,14 +409,67 @@ async def log_action(user_id: str, action: str, entity_type: str, entity_id: str
         new_data=new_data,
         ip_address=ip_address
     )
-    await db.audit_logs.insert_one(log_entry.dict())
+    await db.audit_logs.insert_one(log_entry.dict(), session=session)
+
+async def bump_collection_version(collection: str):
+    # Must run after the write it covers (after commit for multi-document transactions) so a
+    # reader never pairs a new version with old rows; never inside a transaction, where this
+    # shared document would make every concurrent writer conflict
+    await db.collection_versions.update_one({"_id": collection}, {"$inc": {"version": 1}}, upsert=True)
+
+async def check_etag(request: Request, response: Response, collection: str, *params):
+    version_doc = await db.collection_versions.find_one({"_id": collection})
+    version = version_doc['version'] if version_doc else 0
+    digest = hashlib.sha1(json.dumps([collection, version, *params], default=str).encode()).hexdigest()
+    etag = f'W/"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+def branch_scope(current_user: User, branch_id: Optional[str] = None):
+    # Branch users only ever see their own branch; cooperative-wide users may narrow to one
+    if current_user.branch_id:
+        return {"branch_id": current_user.branch_id}
+    if branch_id:
+        return {"branch_id": branch_id}
+    return {}
+
+async def resolve_branch(current_user: User, branch_id: Optional[str] = None):
+    if current_user.branch_id:
+        if branch_id and branch_id != current_user.branch_id:
+            raise HTTPException(status_code=403, detail="Not allowed to operate on another branch")
+        return current_user.branch_id
+    
+    branch_id = branch_id or DEFAULT_BRANCH_ID
+    if not await db.branches.find_one({"id": branch_id, "is_active": True}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Branch not found")
+    return branch_id
+
+async def next_sequence(branch_id: str, name: str, quantity: int = 1):
+    # Per-branch counters so numbering never scans or locks another branch's data. Never called
+    # inside a transaction: the counter would stay locked until commit for the whole branch.
+    sequence = await db.sequences.find_one_and_update(
+        {"_id": f"{branch_id}:{name}"},
+        {"$inc": {"value": quantity}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return sequence['value'] - quantity + 1
 
-async def generate_member_number():
+async def generate_member_numbers(branch_id: str, quantity: int):
     current_year = datetime.now().year
-    count = await db.members.count_documents({}) + 1
-    return f"SOCIO-{current_year}-{count:05d}"
+    first = await next_sequence(branch_id, f"members:{current_year}", quantity)
+    return [f"SOCIO-{branch_id}-{current_year}-{first + offset:05d}" for offset in range(quantity)]
+
+async def generate_member_number(branch_id: str):
+    numbers = await generate_member_numbers(branch_id, 1)
+    return numbers[0]
 
-async def generate_account_number(account_type: AccountType):
+async def generate_account_number(branch_id: str, account_type: AccountType):
     type_prefix = {
         AccountType.CORRIENTE: "CC",
         AccountType.PROGRAMADO: "AP", 
@@ -280,12 +478,197 @@ async def generate_account_number(account_type: AccountType):
         AccountType.AHORROS: "AH",
         AccountType.FONDO_AYUDA_MUTUA: "FM"
     }
-    count = await db.accounts.count_documents({"account_type": account_type}) + 1
-    return f"{type_prefix[account_type]}-{count:08d}"
+    count = await next_sequence(branch_id, f"accounts:{account_type.value}")
+    return f"{type_prefix[account_type]}-{branch_id}-{count:08d}"
+
+async def generate_transaction_references(branch_id: str, quantity: int):
+    first = await next_sequence(branch_id, "transactions", quantity)
+    today = datetime.now().strftime('%Y%m%d')
+    return [f"TXN-{branch_id}-{today}-{first + offset:06d}" for offset in range(quantity)]
+
+async def generate_transaction_reference(branch_id: str):
+    references = await generate_transaction_references(branch_id, 1)
+    return references[0]
+
+async def reserve_transaction_references(counts: Dict[str, int]):
+    # Reserved before any transaction starts: a counter bumped inside one stays locked until
+    # commit and stalls every other posting in the branch. References of an aborted attempt are gaps.
+    return {
+        branch_id: await generate_transaction_references(branch_id, quantity)
+        for branch_id, quantity in counts.items()
+        if quantity > 0
+    }
+
+# Event bus
+# Resume tokens are stored per worker slot ("host:k"), held through a lease in job_locks.
+# Uvicorn workers cannot be given distinct ids, so each one leases the first free slot that
+# already has a token, and a restarted worker picks up the token its predecessor left.
+EVENT_BUS_HOST = socket.gethostname()
+EVENT_BUS_SLOT_LEASE_SECONDS = 30
+EVENT_SOURCES = {
+    EventType.ACCOUNT_BALANCE_CHANGED: "accounts",
+    EventType.ACCOUNT_UPDATED: "accounts",
+    EventType.MEMBER_UPDATED: "members",
+    EventType.USER_UPDATED: "users",
+    EventType.USER_DEACTIVATED: "users",
+    EventType.TRANSACTION_CREATED: "transactions"
+}
+EVENT_BUS_TOKEN_SAVE_SECONDS = 1.0
+EVENT_BUS_RETRY_SECONDS = 5
+CHANGE_STREAM_HISTORY_LOST = 286
+event_handlers: Dict[EventType, List[Callable[[ChangeEvent], Awaitable[None]]]] = {event_type: [] for event_type in EventType}
+
+def subscribe(event_type: EventType):
+    """Register an async handler for an event type; every worker runs its own handlers."""
+    def decorator(handler):
+        event_handlers[event_type].append(handler)
+        return handler
+    return decorator
+
+def change_to_events(change: dict):
+    collection = change['ns']['coll']
+    document = change.get('fullDocument') or {}
+    updated_fields = change.get('updateDescription', {}).get('updatedFields', {})
+    entity_id = document.get('id', str(change['documentKey']['_id']))
+    branch_id = document.get('branch_id')
+    
+    if collection == "transactions":
+        if change['operationType'] != "insert":
+            return []
+        return [ChangeEvent(event_type=EventType.TRANSACTION_CREATED, entity_id=entity_id, branch_id=branch_id, data={
+            "account_id": document.get('account_id'),
+            "transaction_type": document.get('transaction_type'),
+            "amount": document.get('amount')
+        })]
+    if collection == "accounts":
+        if "balance" in updated_fields:
+            return [ChangeEvent(event_type=EventType.ACCOUNT_BALANCE_CHANGED, entity_id=entity_id, branch_id=branch_id, data={"balance": updated_fields['balance']})]
+        return [ChangeEvent(event_type=EventType.ACCOUNT_UPDATED, entity_id=entity_id, branch_id=branch_id, data={"fields": list(updated_fields)})]
+    if collection == "members":
+        return [ChangeEvent(event_type=EventType.MEMBER_UPDATED, entity_id=entity_id, branch_id=branch_id, data={"fields": list(updated_fields)})]
+    if collection == "users":
+        if updated_fields.get('is_active') is False or (change['operationType'] == "replace" and document.get('is_active') is False):
+            return [ChangeEvent(event_type=EventType.USER_DEACTIVATED, entity_id=entity_id, branch_id=branch_id, data={"username": document.get('username')})]
+        return [ChangeEvent(event_type=EventType.USER_UPDATED, entity_id=entity_id, branch_id=branch_id, data={"username": document.get('username')})]
+    return []
+
+def change_stream_options(subscribed: set):
+    """Build the change stream (pipeline, full_document) covering only the subscribed event types."""
+    collections = {EVENT_SOURCES[event_type] for event_type in subscribed}
+    clauses = []
+    if "transactions" in collections:
+        clauses.append({"ns.coll": "transactions", "operationType": "insert"})
+    others = collections - {"transactions"}
+    if "accounts" in others and EventType.ACCOUNT_UPDATED not in subscribed:
+        # Balance subscribers alone never see the other account writes
+        others.discard("accounts")
+        clauses.append({"ns.coll": "accounts", "operationType": "update", "updateDescription.updatedFields.balance": {"$exists": True}})
+    if others:
+        clauses.append({"ns.coll": {"$in": sorted(others)}, "operationType": {"$in": ["insert", "update", "replace"]}})
+    # Inserts already carry the document; only update events need the extra lookup read
+    full_document = "updateLookup" if collections != {"transactions"} else None
+    return [{"$match": {"$or": clauses}}], full_document
+
+async def dispatch_event(event: ChangeEvent):
+    for handler in event_handlers[event.event_type]:
+        try:
+            await handler(event)
+        except Exception:
+            logger.exception(f"Event handler {handler.__name__} failed for {event.event_type}")
+
+async def claim_event_bus_slot():
+    """Lease a consumer slot on this host and return its id.
+
+    Slots with a stored token are preferred for up to one lease period, which is how long a
+    crashed worker's lease takes to expire; after that a new slot is opened at the lowest free index.
+    """
+    deadline = time.monotonic() + EVENT_BUS_SLOT_LEASE_SECONDS
+    while time.monotonic() < deadline:
+        known = await db.event_bus_tokens.find({"host": EVENT_BUS_HOST}, {"slot": 1}).sort("slot", 1).to_list(None)
+        if not known:
+            break
+        for token_doc in known:
+            if await acquire_job_lock(f"event_bus:{token_doc['_id']}", EVENT_BUS_SLOT_LEASE_SECONDS):
+                return token_doc['_id']
+        await asyncio.sleep(1)
+    
+    slot = 0
+    while not await acquire_job_lock(f"event_bus:{EVENT_BUS_HOST}:{slot}", EVENT_BUS_SLOT_LEASE_SECONDS):
+        slot += 1
+    consumer = f"{EVENT_BUS_HOST}:{slot}"
+    await db.event_bus_tokens.update_one(
+        {"_id": consumer},
+        {"$setOnInsert": {"host": EVENT_BUS_HOST, "slot": slot, "token": None, "updated_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+    return consumer
+
+async def watch_changes():
+    consumer = await claim_event_bus_slot()
+    try:
+        token_doc = await db.event_bus_tokens.find_one({"_id": consumer})
+        resume_token = token_doc['token'] if token_doc else None
+        pipeline, full_document = change_stream_options({event_type for event_type, handlers in event_handlers.items() if handlers})
+        
+        try:
+            async with db.watch(pipeline, full_document=full_document, resume_after=resume_token, max_await_time_ms=int(EVENT_BUS_TOKEN_SAVE_SECONDS * 1000)) as stream:
+                saved_at = time.monotonic()
+                while True:
+                    # try_next returns None once the server has nothing new, so quiet periods
+                    # still save the token and renew the lease
+                    change = await stream.try_next()
+                    if change:
+                        for event in change_to_events(change):
+                            await dispatch_event(event)
+                    if time.monotonic() - saved_at >= EVENT_BUS_TOKEN_SAVE_SECONDS:
+                        if not await acquire_job_lock(f"event_bus:{consumer}", EVENT_BUS_SLOT_LEASE_SECONDS):
+                            raise RuntimeError(f"Event bus lost the lease on {consumer}")
+                        await db.event_bus_tokens.update_one(
+                            {"_id": consumer},
+                            {"$set": {"token": stream.resume_token, "updated_at": datetime.now(timezone.utc)}}
+                        )
+                        saved_at = time.monotonic()
+        except OperationFailure as e:
+            if e.code != CHANGE_STREAM_HISTORY_LOST:
+                raise
+            # The oplog no longer holds our position; the next attempt starts from now
+            logger.warning("Event bus resume token expired, continuing from the current position")
+            await db.event_bus_tokens.update_one({"_id": consumer}, {"$set": {"token": None}})
+    finally:
+        await release_job_lock(f"event_bus:{consumer}")
+
+async def event_bus_loop():
+    # Without handlers a stream would only add reads to every write
+    if not any(event_handlers.values()):
+        logger.info("No event handlers registered, event bus not started")
+        return
+    while True:
+        try:
+            await watch_changes()
+        except Exception:
+            logger.exception("Event bus change stream failed, reconnecting")
+        await asyncio.sleep(EVENT_BUS_RETRY_SECONDS)
+
+# Branches endpoints
+@api_router.post("/branches", response_model=Branch)
+async def create_branch(branch: BranchCreate, current_user: User = Depends(get_current_user)):
+    if current_user.role != UserRole.ADMIN or current_user.branch_id:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    
+    if await db.branches.find_one({"id": branch.id}):
+        raise HTTPException(status_code=400, detail="Branch already exists")
+    
+    branch_obj = Branch(**branch.dict())
+    await db.branches.insert_one(branch_obj.dict())
+    await log_action(current_user.id, "CREATE_BRANCH", "Branch", branch_obj.id)
+    
+    return branch_obj
 
-async def generate_transaction_reference():
-    count = await db.transactions.count_documents({}) + 1
-    return f"TXN-{datetime.now().strftime('%Y%m%d')}-{count:06d}"
+@api_router.get("/branches", response_model=List[Branch])
+async def get_branches(current_user: User = Depends(get_current_user)):
+    query = {"id": current_user.branch_id} if current_user.branch_id else {}
+    branches = await db.branches.find(query).sort("id", 1).to_list(1000)
+    return [Branch(**branch) for branch in branches]
 
 # Authentication endpoints
 @api_router.post("/auth/register", response_model=User)
@@ -299,6 +682,9 @@ async def register(user: UserCreate, current_user: User = Depends(get_current_us
     if existing_user:
         raise HTTPException(status_code=400, detail="Username or email already registered")
     
+    if user.branch_id or user.role != UserRole.ADMIN or current_user.branch_id:
+        user.branch_id = await resolve_branch(current_user, user.branch_id)
+    
     # Create user
     hashed_password = get_password_hash(user.password)
     user_dict = user.dict()
@@ -309,6 +695,7 @@ async def register(user: UserCreate, current_user: User = Depends(get_current_us
     user_data = user_obj.dict()
     user_data['password'] = hashed_password
     await db.users.insert_one(user_data)
+    await bump_collection_version("users")
     
     await log_action(current_user.id, "CREATE_USER", "User", user_obj.id)
     return user_obj
@@ -328,7 +715,7 @@ async def login(form_data: UserLogin):
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user['username']}, expires_delta=access_token_expires
+        data={"sub": user['username'], "role": user['role']}, expires_delta=access_token_expires
     )
     
     user_obj = User(**user)
@@ -353,20 +740,28 @@ async def create_member(member: MemberCreate, current_user: User = Depends(get_c
     if existing:
         raise HTTPException(status_code=400, detail="Member with this identity or email already exists")
     
-    member_number = await generate_member_number()
-    member_dict = member.dict()
-    member_obj = Member(**member_dict, member_number=member_number)
+    branch_id = await resolve_branch(current_user, member.branch_id)
+    member_number = await generate_member_number(branch_id)
+    member_dict = member.dict(exclude={"branch_id"})
+    member_obj = Member(**member_dict, member_number=member_number, branch_id=branch_id)
     
     await db.members.insert_one(member_obj.dict())
+    await bump_collection_version("members")
     await log_action(current_user.id, "CREATE_MEMBER", "Member", member_obj.id)
     
     return member_obj
 
 @api_router.get("/members", response_model=List[Member])
-async def get_members(skip: int = 0, limit: int = 100, search: Optional[str] = None, current_user: User = Depends(get_current_user)):
-    query = {}
+async def get_members(request: Request, response: Response, skip: int = 0, limit: int = 100, search: Optional[str] = None, branch_id: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    scope = branch_scope(current_user, branch_id)
+    not_modified = await check_etag(request, response, "members", skip, limit, search, scope)
+    if not_modified:
+        return not_modified
+    
+    query = dict(scope)
     if search:
         query = {
+            **scope,
             "$or": [
                 {"member_number": {"$regex": search, "$options": "i"}},
                 {"identity_document": {"$regex": search, "$options": "i"}},
@@ -380,7 +775,7 @@ async def get_members(skip: int = 0, limit: int = 100, search: Optional[str] = N
 
 @api_router.get("/members/{member_id}", response_model=Member)
 async def get_member(member_id: str, current_user: User = Depends(get_current_user)):
-    member = await db.members.find_one({"id": member_id})
+    member = await db.members.find_one({"id": member_id, **branch_scope(current_user)})
     if not member:
         raise HTTPException(status_code=404, detail="Member not found")
     return Member(**member)
@@ -390,17 +785,19 @@ async def update_member(member_id: str, member_update: MemberCreate, current_use
     if current_user.role not in [UserRole.ADMIN, UserRole.CAJERO]:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    existing = await db.members.find_one({"id": member_id})
+    existing = await db.members.find_one({"id": member_id, **branch_scope(current_user)})
     if not existing:
         raise HTTPException(status_code=404, detail="Member not found")
     
     old_data = existing.copy()
-    update_data = member_update.dict()
+    # branch_id is part of the shard key and never changes after creation
+    update_data = member_update.dict(exclude={"branch_id"})
     
-    result = await db.members.update_one({"id": member_id}, {"$set": update_data})
+    result = await db.members.update_one({"id": member_id, "branch_id": existing['branch_id']}, {"$set": update_data})
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Member not found")
     
+    await bump_collection_version("members")
     updated_member = await db.members.find_one({"id": member_id})
     await log_action(current_user.id, "UPDATE_MEMBER", "Member", member_id, old_data, update_data)
     
@@ -413,12 +810,13 @@ async def create_account(account: AccountCreate, current_user: User = Depends(ge
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
     # Verify member exists
-    member = await db.members.find_one({"id": account.member_id})
+    member = await db.members.find_one({"id": account.member_id, **branch_scope(current_user)})
     if not member:
         raise HTTPException(status_code=404, detail="Member not found")
     
     # Check if member already has this type of account
     existing_account = await db.accounts.find_one({
+        "branch_id": member['branch_id'],
         "member_id": account.member_id,
         "account_type": account.account_type
     })
@@ -438,23 +836,26 @@ async def create_account(account: AccountCreate, current_user: User = Depends(ge
     if account.initial_deposit < minimum_deposits[account.account_type]:
         raise HTTPException(status_code=400, detail=f"Minimum deposit for {account.account_type} is {minimum_deposits[account.account_type]}")
     
-    account_number = await generate_account_number(account.account_type)
+    account_number = await generate_account_number(member['branch_id'], account.account_type)
     account_obj = Account(
         account_number=account_number,
         member_id=account.member_id,
+        branch_id=member['branch_id'],
         account_type=account.account_type,
         balance=account.initial_deposit,
         minimum_balance=minimum_deposits[account.account_type]
     )
     
     await db.accounts.insert_one(account_obj.dict())
+    await bump_collection_version("accounts")
     
     # Create opening transaction
-    reference = await generate_transaction_reference()
+    reference = await generate_transaction_reference(account_obj.branch_id)
     transaction = Transaction(
         reference=reference,
         account_id=account_obj.id,
         member_id=account.member_id,
+        branch_id=account_obj.branch_id,
         transaction_type=TransactionType.APERTURA,
         amount=account.initial_deposit,
         balance_before=0,
@@ -469,8 +870,13 @@ async def create_account(account: AccountCreate, current_user: User = Depends(ge
     return account_obj
 
 @api_router.get("/accounts", response_model=List[Account])
-async def get_accounts(member_id: Optional[str] = None, current_user: User = Depends(get_current_user)):
-    query = {}
+async def get_accounts(request: Request, response: Response, member_id: Optional[str] = None, branch_id: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    scope = branch_scope(current_user, branch_id)
+    not_modified = await check_etag(request, response, "accounts", member_id, scope)
+    if not_modified:
+        return not_modified
+    
+    query = dict(scope)
     if member_id:
         query["member_id"] = member_id
     
@@ -483,52 +889,52 @@ async def create_transaction(transaction: TransactionCreate, current_user: User
     if current_user.role not in [UserRole.ADMIN, UserRole.CAJERO]:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    # Get account
-    account = await db.accounts.find_one({"id": transaction.account_id})
-    if not account:
-        raise HTTPException(status_code=404, detail="Account not found")
-    
-    if account['is_blocked']:
-        raise HTTPException(status_code=400, detail="Account is blocked")
-    
-    balance_before = account['balance']
-    
-    # Validate transaction
+    # Validate and update the balance in one conditional write, so concurrent transfers,
+    # syncs and scheduled deposits on the same account are never overwritten
+    scope = branch_scope(current_user)
+    query = {"id": transaction.account_id, **scope, "is_blocked": False}
+    change = transaction.amount
     if transaction.transaction_type == TransactionType.RETIRO:
-        if balance_before < transaction.amount:
-            raise HTTPException(status_code=400, detail="Insufficient funds")
-        balance_after = balance_before - transaction.amount
-    else:  # DEPOSITO
-        balance_after = balance_before + transaction.amount
+        query["balance"] = {"$gte": transaction.amount}
+        change = -transaction.amount
+    
+    account = await db.accounts.find_one_and_update(
+        query,
+        {"$inc": {"balance": change}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not account:
+        account = await db.accounts.find_one({"id": transaction.account_id, **scope}, {"is_blocked": 1})
+        if not account:
+            raise HTTPException(status_code=404, detail="Account not found")
+        if account['is_blocked']:
+            raise HTTPException(status_code=400, detail="Account is blocked")
+        raise HTTPException(status_code=400, detail="Insufficient funds")
+    await bump_collection_version("accounts")
     
     # Create transaction
-    reference = await generate_transaction_reference()
+    reference = await generate_transaction_reference(account['branch_id'])
     transaction_obj = Transaction(
         reference=reference,
         account_id=transaction.account_id,
         member_id=account['member_id'],
+        branch_id=account['branch_id'],
         transaction_type=transaction.transaction_type,
         amount=transaction.amount,
-        balance_before=balance_before,
-        balance_after=balance_after,
+        balance_before=account['balance'] - change,
+        balance_after=account['balance'],
         description=transaction.description or f"{transaction.transaction_type} - {transaction.amount}",
         created_by=current_user.id
     )
     
-    # Update account balance
-    await db.accounts.update_one(
-        {"id": transaction.account_id},
-        {"$set": {"balance": balance_after}}
-    )
-    
     await db.transactions.insert_one(transaction_obj.dict())
     await log_action(current_user.id, "CREATE_TRANSACTION", "Transaction", transaction_obj.id)
     
     return transaction_obj
 
 @api_router.get("/transactions", response_model=List[Transaction])
-async def get_transactions(account_id: Optional[str] = None, member_id: Optional[str] = None, skip: int = 0, limit: int = 100, current_user: User = Depends(get_current_user)):
-    query = {}
+async def get_transactions(account_id: Optional[str] = None, member_id: Optional[str] = None, branch_id: Optional[str] = None, skip: int = 0, limit: int = 100, current_user: User = Depends(get_current_user)):
+    query = branch_scope(current_user, branch_id)
     if account_id:
         query["account_id"] = account_id
     if member_id:
@@ -537,6 +943,817 @@ async def get_transactions(account_id: Optional[str] = None, member_id: Optional
     transactions = await db.transactions.find(query).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
     return [Transaction(**transaction) for transaction in transactions]
 
+# Transfers endpoints
+async def transfer_failure(account_id: str, branch_id: str, session, member_id: Optional[str] = None):
+    # Only reached once a conditional update matched nothing, so the transaction is aborting anyway
+    account = await db.accounts.find_one({"id": account_id, "branch_id": branch_id}, session=session)
+    if not account:
+        return HTTPException(status_code=404, detail="Account not found")
+    if member_id and account['member_id'] != member_id:
+        return HTTPException(status_code=400, detail="Transfers are only allowed between accounts of the same member")
+    if account['is_blocked']:
+        return HTTPException(status_code=400, detail="Account is blocked")
+    return HTTPException(status_code=400, detail="Insufficient funds")
+
+async def apply_transfer(transfer: TransferCreate, branch_id: str, references: List[str], current_user: User, session):
+    # The filters carry every validation, so the happy path is two writes with no pre-reads
+    source = await db.accounts.find_one_and_update(
+        {"id": transfer.from_account_id, "branch_id": branch_id, "is_blocked": False, "balance": {"$gte": transfer.amount}},
+        {"$inc": {"balance": -transfer.amount}},
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+    if not source:
+        raise await transfer_failure(transfer.from_account_id, branch_id, session)
+    target = await db.accounts.find_one_and_update(
+        {"id": transfer.to_account_id, "branch_id": branch_id, "member_id": source['member_id'], "is_blocked": False},
+        {"$inc": {"balance": transfer.amount}},
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+    if not target:
+        raise await transfer_failure(transfer.to_account_id, branch_id, session, source['member_id'])
+    
+    debit_reference, credit_reference = references
+    transfer_id = str(uuid.uuid4())
+    description = transfer.description or f"Transferencia {source['account_number']} -> {target['account_number']}"
+    debit = Transaction(
+        reference=debit_reference,
+        account_id=source['id'],
+        member_id=source['member_id'],
+        branch_id=source['branch_id'],
+        transaction_type=TransactionType.RETIRO,
+        amount=transfer.amount,
+        balance_before=source['balance'] + transfer.amount,
+        balance_after=source['balance'],
+        description=description,
+        created_by=current_user.id,
+        transfer_id=transfer_id
+    )
+    await db.transactions.insert_one(debit.dict(), session=session)
+    credit = Transaction(
+        reference=credit_reference,
+        account_id=target['id'],
+        member_id=target['member_id'],
+        branch_id=target['branch_id'],
+        transaction_type=TransactionType.DEPOSITO,
+        amount=transfer.amount,
+        balance_before=target['balance'] - transfer.amount,
+        balance_after=target['balance'],
+        description=description,
+        created_by=current_user.id,
+        transfer_id=transfer_id
+    )
+    await db.transactions.insert_one(credit.dict(), session=session)
+    await log_action(current_user.id, "CREATE_TRANSFER", "Transfer", transfer_id, new_data={"debit": debit.id, "credit": credit.id}, session=session)
+    
+    return Transfer(id=transfer_id, member_id=source['member_id'], amount=transfer.amount, debit=debit, credit=credit)
+
+async def execute_transfers(transfers: List[TransferCreate], current_user: User):
+    for transfer in transfers:
+        if transfer.from_account_id == transfer.to_account_id:
+            raise HTTPException(status_code=400, detail="Source and destination accounts must differ")
+    
+    # Both accounts belong to one member and therefore one branch; branch users already know
+    # it, cooperative-wide users need one lookup to target the right shard. A branch never
+    # changes, so this read stays outside the transaction.
+    if current_user.branch_id:
+        branches = [current_user.branch_id] * len(transfers)
+    else:
+        account_branches = {
+            account['id']: account['branch_id']
+            for account in await db.accounts.find(
+                {"id": {"$in": list({transfer.from_account_id for transfer in transfers})}},
+                {"id": 1, "branch_id": 1}
+            ).to_list(None)
+        }
+        if any(transfer.from_account_id not in account_branches for transfer in transfers):
+            raise HTTPException(status_code=404, detail="Account not found")
+        branches = [account_branches[transfer.from_account_id] for transfer in transfers]
+    
+    counts = {}
+    for branch_id in branches:
+        counts[branch_id] = counts.get(branch_id, 0) + 2
+    reserved = await reserve_transaction_references(counts)
+    
+    async def run(session):
+        # A retried attempt starts again from the first reserved reference
+        references = {branch_id: iter(branch_references) for branch_id, branch_references in reserved.items()}
+        return [
+            await apply_transfer(transfer, branch_id, [next(references[branch_id]), next(references[branch_id])], current_user, session)
+            for transfer, branch_id in zip(transfers, branches)
+        ]
+    
+    # with_transaction retries the whole batch on TransientTransactionError and
+    # UnknownTransactionCommitResult; any HTTPException aborts it with no partial writes
+    async with await client.start_session() as session:
+        results = await session.with_transaction(run)
+    await bump_collection_version("accounts")
+    return results
+
+@api_router.post("/transfers", response_model=Transfer)
+async def create_transfer(transfer: TransferCreate, current_user: User = Depends(get_current_user)):
+    if current_user.role not in [UserRole.ADMIN, UserRole.CAJERO]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    
+    transfers = await execute_transfers([transfer], current_user)
+    return transfers[0]
+
+@api_router.post("/transfers/batch", response_model=List[Transfer])
+async def create_transfers_batch(transfers: List[TransferCreate], current_user: User = Depends(get_current_user)):
+    if current_user.role not in [UserRole.ADMIN, UserRole.CAJERO]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    if not transfers:
+        raise HTTPException(status_code=400, detail="No transfers provided")
+    
+    return await execute_transfers(transfers, current_user)
+
+# Offline sync endpoints
+MAX_SYNC_OPERATIONS = 5000
+
+SYNC_AUDIT_ACTIONS = {
+    SyncOperationType.SOCIO: ("CREATE_MEMBER", "Member"),
+    SyncOperationType.DEPOSITO: ("CREATE_TRANSACTION", "Transaction"),
+    SyncOperationType.RETIRO: ("CREATE_TRANSACTION", "Transaction"),
+    SyncOperationType.APORTE_MUTUA: ("CREATE_CONTRIBUTION", "MutualAidContribution")
+}
+
+def screen_sync_operations(operations: List[SyncOperation], previous: Dict[str, dict]):
+    """Answer replays and invalid amounts up front; returns (results, pending operations)."""
+    results = {}
+    pending = []
+    for operation in operations:
+        if operation.client_op_id in results:
+            continue
+        if operation.client_op_id in previous:
+            record = previous[operation.client_op_id]
+            results[operation.client_op_id] = SyncResult(
+                client_op_id=operation.client_op_id,
+                status=SyncStatus.DUPLICADA,
+                entity_id=record.get('entity_id'),
+                reference=record.get('reference')
+            )
+        elif operation.op_type != SyncOperationType.SOCIO and (operation.amount is None or not math.isfinite(operation.amount) or operation.amount <= 0):
+            # NaN slips past "<= 0" and would poison the account balance through $inc
+            results[operation.client_op_id] = SyncResult(client_op_id=operation.client_op_id, status=SyncStatus.CONFLICTO, detail="Amount must be a positive number")
+        else:
+            results[operation.client_op_id] = None
+            pending.append(operation)
+    return results, pending
+
+def screen_new_members(member_ops: List[SyncOperation], taken_identities: set, taken_emails: set):
+    """Returns (accepted operations, {client_op_id: conflict detail})."""
+    taken_identities = set(taken_identities)
+    taken_emails = set(taken_emails)
+    accepted = []
+    conflicts = {}
+    for operation in member_ops:
+        if not operation.member:
+            conflicts[operation.client_op_id] = "Member data missing"
+        elif operation.member.identity_document in taken_identities or operation.member.email in taken_emails:
+            conflicts[operation.client_op_id] = "Member with this identity or email already exists"
+        else:
+            taken_identities.add(operation.member.identity_document)
+            taken_emails.add(operation.member.email)
+            accepted.append(operation)
+    return accepted, conflicts
+
+def replay_account_operations(money_ops: List[SyncOperation], accounts: Dict[str, dict]):
+    """Replay deposits and withdrawals in order against a running balance per account.
+
+    Returns (postings as (operation, transaction type, balance before, balance after),
+    {client_op_id: conflict detail}, final balance per account).
+    """
+    balances = {account_id: account['balance'] for account_id, account in accounts.items()}
+    postings = []
+    conflicts = {}
+    for operation in money_ops:
+        account = accounts.get(operation.account_id)
+        if not account:
+            conflicts[operation.client_op_id] = "Account not found"
+            continue
+        if account['is_blocked']:
+            conflicts[operation.client_op_id] = "Account is blocked"
+            continue
+        balance_before = balances[account['id']]
+        if operation.op_type == SyncOperationType.RETIRO:
+            if balance_before < operation.amount:
+                conflicts[operation.client_op_id] = "Insufficient funds"
+                continue
+            balance_after = balance_before - operation.amount
+            transaction_type = TransactionType.RETIRO
+        else:
+            balance_after = balance_before + operation.amount
+            transaction_type = TransactionType.DEPOSITO
+        balances[account['id']] = balance_after
+        postings.append((operation, transaction_type, balance_before, balance_after))
+    return postings, conflicts, balances
+
+def order_sync_results(operations: List[SyncOperation], results: Dict[str, SyncResult]):
+    # An op id repeated inside the batch reports the first occurrence's outcome as a duplicate
+    output = []
+    reported = set()
+    for operation in operations:
+        result = results[operation.client_op_id]
+        if operation.client_op_id in reported:
+            result = SyncResult(client_op_id=operation.client_op_id, status=SyncStatus.DUPLICADA, entity_id=result.entity_id, reference=result.reference)
+        reported.add(operation.client_op_id)
+        output.append(result)
+    return output
+
+async def reserve_sync_numbers(batch: SyncBatch, current_user: User, branch_id: str):
+    """Reserve member numbers and transaction references for a batch before its transaction.
+
+    Returns (member numbers, {account_id: branch_id}, {branch_id: references}). Counts are an
+    upper bound: operations that end up duplicated or in conflict leave gaps in the numbering.
+    """
+    operations = list({operation.client_op_id: operation for operation in batch.operations}.values())
+    member_count = sum(1 for operation in operations if operation.op_type == SyncOperationType.SOCIO and operation.member)
+    member_numbers = await generate_member_numbers(branch_id, member_count) if member_count else []
+    
+    money_ops = [operation for operation in operations if operation.op_type in [SyncOperationType.DEPOSITO, SyncOperationType.RETIRO] and operation.account_id]
+    # An account's branch never changes, so it is safe to read outside the transaction
+    account_branches = {
+        account['id']: account['branch_id']
+        for account in await db.accounts.find(
+            {"id": {"$in": list({operation.account_id for operation in money_ops})}, **branch_scope(current_user)},
+            {"id": 1, "branch_id": 1}
+        ).to_list(None)
+    }
+    counts = {}
+    for operation in money_ops:
+        if operation.account_id in account_branches:
+            account_branch_id = account_branches[operation.account_id]
+            counts[account_branch_id] = counts.get(account_branch_id, 0) + 1
+    return member_numbers, account_branches, await reserve_transaction_references(counts)
+
+async def apply_sync_batch(batch: SyncBatch, current_user: User, branch_id: str, member_numbers: List[str], account_branches: Dict[str, str], reserved_references: Dict[str, List[str]], session):
+    operations = sorted(batch.operations, key=lambda operation: operation.client_timestamp)
+    applied = []
+    
+    # Replays of operations this terminal already synced are answered from the stored outcome
+    op_ids = [operation.client_op_id for operation in operations]
+    previous = {
+        record['client_op_id']: record
+        for record in await db.sync_operations.find({"terminal_id": batch.terminal_id, "client_op_id": {"$in": op_ids}}, session=session).to_list(None)
+    }
+    results, pending = screen_sync_operations(operations, previous)
+    
+    def conflict(client_op_id, detail):
+        results[client_op_id] = SyncResult(client_op_id=client_op_id, status=SyncStatus.CONFLICTO, detail=detail)
+    
+    def apply(operation, entity_id, reference=None):
+        results[operation.client_op_id] = SyncResult(client_op_id=operation.client_op_id, status=SyncStatus.APLICADA, entity_id=entity_id, reference=reference)
+        applied.append({
+            "terminal_id": batch.terminal_id,
+            "client_op_id": operation.client_op_id,
+            "client_timestamp": operation.client_timestamp,
+            "op_type": operation.op_type,
+            "entity_id": entity_id,
+            "reference": reference,
+            "applied_by": current_user.id,
+            "applied_at": datetime.now(timezone.utc)
+        })
+    
+    # Members
+    member_ops = [operation for operation in pending if operation.op_type == SyncOperationType.SOCIO]
+    new_members = []
+    if member_ops:
+        identities = [operation.member.identity_document for operation in member_ops if operation.member]
+        emails = [operation.member.email for operation in member_ops if operation.member]
+        taken = await db.members.find(
+            {"$or": [{"identity_document": {"$in": identities}}, {"email": {"$in": emails}}]},
+            {"identity_document": 1, "email": 1},
+            session=session
+        ).to_list(None)
+        accepted, conflicts = screen_new_members(
+            member_ops,
+            {member['identity_document'] for member in taken},
+            {member['email'] for member in taken}
+        )
+        for client_op_id, detail in conflicts.items():
+            conflict(client_op_id, detail)
+        if accepted:
+            for operation, member_number in zip(accepted, member_numbers):
+                member_obj = Member(**operation.member.dict(exclude={"branch_id"}), member_number=member_number, branch_id=branch_id)
+                new_members.append(member_obj.dict())
+                apply(operation, member_obj.id, member_number)
+            await db.members.insert_many(new_members, session=session)
+    
+    # Deposits and withdrawals
+    money_ops = [operation for operation in pending if operation.op_type in [SyncOperationType.DEPOSITO, SyncOperationType.RETIRO]]
+    # Accounts missing from the reservation read get no references and replay as not found
+    accounts = {
+        account['id']: account
+        for account in await db.accounts.find({"id": {"$in": list(account_branches)}, **branch_scope(current_user)}, session=session).to_list(None)
+    }
+    postings, conflicts, balances = replay_account_operations(money_ops, accounts)
+    for client_op_id, detail in conflicts.items():
+        conflict(client_op_id, detail)
+    
+    if postings:
+        transactions = []
+        for operation, transaction_type, balance_before, balance_after in postings:
+            account = accounts[operation.account_id]
+            transactions.append((operation, Transaction(
+                reference="",
+                account_id=account['id'],
+                member_id=account['member_id'],
+                branch_id=account['branch_id'],
+                transaction_type=transaction_type,
+                amount=operation.amount,
+                balance_before=balance_before,
+                balance_after=balance_after,
+                description=operation.description or f"{transaction_type} - {operation.amount}",
+                created_by=current_user.id
+            )))
+        # A retried attempt starts again from the first reserved reference
+        references = {transaction_branch_id: iter(branch_references) for transaction_branch_id, branch_references in reserved_references.items()}
+        for operation, transaction in transactions:
+            transaction.reference = next(references[transaction.branch_id])
+            apply(operation, transaction.id, transaction.reference)
+        await db.transactions.insert_many([transaction.dict() for _, transaction in transactions], session=session)
+        await db.accounts.bulk_write(
+            [
+                UpdateOne(
+                    {"id": account_id, "branch_id": accounts[account_id]['branch_id']},
+                    {"$inc": {"balance": balances[account_id] - accounts[account_id]['balance']}}
+                )
+                for account_id in {transaction.account_id for _, transaction in transactions}
+            ],
+            ordered=False,
+            session=session
+        )
+    
+    # Mutual aid contributions
+    contribution_ops = [operation for operation in pending if operation.op_type == SyncOperationType.APORTE_MUTUA]
+    if contribution_ops:
+        member_ids = list({operation.member_id for operation in contribution_ops if operation.member_id})
+        known_members = {
+            member['id']
+            for member in await db.members.find({"id": {"$in": member_ids}, **branch_scope(current_user)}, {"id": 1}, session=session).to_list(None)
+        }
+        known_members.update(member['id'] for member in new_members)
+        contributions = []
+        for operation in contribution_ops:
+            if operation.member_id not in known_members:
+                conflict(operation.client_op_id, "Member not found")
+                continue
+            contribution = MutualAidContribution(
+                member_id=operation.member_id,
+                amount=operation.amount,
+                month=operation.client_timestamp.month,
+                year=operation.client_timestamp.year
+            )
+            contributions.append(contribution.dict())
+            apply(operation, contribution.id)
+        if contributions:
+            await db.mutual_aid_contributions.insert_many(contributions, session=session)
+    
+    if applied:
+        await db.sync_operations.insert_many(applied, session=session)
+        await db.audit_logs.insert_many([
+            AuditLog(
+                user_id=current_user.id,
+                action=SYNC_AUDIT_ACTIONS[record['op_type']][0],
+                entity_type=SYNC_AUDIT_ACTIONS[record['op_type']][1],
+                entity_id=record['entity_id'],
+                new_data={"terminal_id": batch.terminal_id, "client_op_id": record['client_op_id']},
+                ip_address="127.0.0.1"
+            ).dict()
+            for record in applied
+        ], session=session)
+        await log_action(current_user.id, "SYNC_BATCH", "SyncBatch", batch.terminal_id, new_data={"applied": len(applied), "received": len(operations)}, session=session)
+    
+    return order_sync_results(batch.operations, results)
+
+@api_router.post("/sync", response_model=List[SyncResult])
+async def sync_terminal_batch(batch: SyncBatch, current_user: User = Depends(get_current_user)):
+    if current_user.role not in [UserRole.ADMIN, UserRole.CAJERO]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    if len(batch.operations) > MAX_SYNC_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SYNC_OPERATIONS} operations per sync batch")
+    
+    branch_id = await resolve_branch(current_user)
+    member_numbers, account_branches, references = await reserve_sync_numbers(batch, current_user, branch_id)
+    
+    async def run(session):
+        return await apply_sync_batch(batch, current_user, branch_id, member_numbers, account_branches, references, session)
+    
+    try:
+        async with await client.start_session() as session:
+            results = await session.with_transaction(run)
+    except (DuplicateKeyError, BulkWriteError) as e:
+        write_errors = e.details.get('writeErrors', []) if isinstance(e, BulkWriteError) else []
+        if isinstance(e, BulkWriteError) and not any(error.get('code') == 11000 for error in write_errors):
+            raise
+        # Another sync from this terminal recorded the same operations first
+        raise HTTPException(status_code=409, detail="Overlapping sync in progress for this terminal, retry")
+    
+    applied_types = {
+        operation.op_type
+        for operation, result in zip(batch.operations, results)
+        if result.status == SyncStatus.APLICADA
+    }
+    if applied_types & {SyncOperationType.DEPOSITO, SyncOperationType.RETIRO}:
+        await bump_collection_version("accounts")
+    if SyncOperationType.SOCIO in applied_types:
+        await bump_collection_version("members")
+    return results
+
+# Deposit schedules
+DEPOSIT_SCHEDULER_INTERVAL_SECONDS = int(os.environ.get('DEPOSIT_SCHEDULER_INTERVAL_SECONDS', '3600'))
+DEPOSIT_SCHEDULE_BATCH_SIZE = 500
+DEPOSIT_SCHEDULE_LOCK_SECONDS = 600
+MAX_CATCH_UP_RUNS = 12
+WORKER_ID = str(uuid.uuid4())
+
+def add_months(value: datetime, months: int, day: int):
+    month_index = value.month - 1 + months
+    return value.replace(year=value.year + month_index // 12, month=month_index % 12 + 1, day=day)
+
+def first_run_date(day_of_month: int):
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    candidate = today.replace(day=day_of_month)
+    return candidate if candidate >= today else add_months(candidate, 1, day_of_month)
+
+async def acquire_job_lock(name: str, ttl_seconds: int):
+    now = datetime.now(timezone.utc)
+    try:
+        await db.job_locks.find_one_and_update(
+            {"_id": name, "$or": [{"owner": WORKER_ID}, {"locked_until": {"$lt": now}}]},
+            {"$set": {"owner": WORKER_ID, "locked_until": now + timedelta(seconds=ttl_seconds)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Lock document exists and is held by another worker
+        return False
+    return True
+
+async def release_job_lock(name: str):
+    await db.job_locks.update_one({"_id": name, "owner": WORKER_ID}, {"$set": {"locked_until": datetime.now(timezone.utc)}})
+
+def plan_schedule_runs(schedule: dict, account: Optional[dict], now: datetime):
+    """Split every run due up to now into runs to post and skipped runs with their reason.
+
+    Returns (run dates to post, [(run date, reason)], next run date).
+    """
+    day = schedule['day_of_month']
+    run_date = schedule['next_run_date'].replace(tzinfo=timezone.utc)
+    to_post = []
+    skipped = []
+    while run_date <= now:
+        if not account:
+            skipped.append((run_date, "ACCOUNT_NOT_FOUND"))
+        elif account['is_blocked']:
+            skipped.append((run_date, "ACCOUNT_BLOCKED"))
+        elif len(to_post) >= MAX_CATCH_UP_RUNS:
+            skipped.append((run_date, "CATCH_UP_LIMIT"))
+        else:
+            to_post.append(run_date)
+        run_date = add_months(run_date, 1, day)
+    return to_post, skipped, run_date
+
+async def post_deposit_schedule_batch(schedules: List[dict], now: datetime):
+    # Reserve for every due run as if no account were blocked; skipped runs leave gaps
+    counts = {}
+    for schedule in schedules:
+        to_post, _, _ = plan_schedule_runs(schedule, {"is_blocked": False}, now)
+        counts[schedule['branch_id']] = counts.get(schedule['branch_id'], 0) + len(to_post)
+    reserved = await reserve_transaction_references(counts)
+    
+    async def run(session):
+        account_ids = list({schedule['account_id'] for schedule in schedules})
+        accounts = {
+            account['id']: account
+            for account in await db.accounts.find({"id": {"$in": account_ids}}, session=session).to_list(len(account_ids))
+        }
+        
+        transactions = []
+        account_updates = {}
+        schedule_updates = []
+        skipped_logs = []
+        for schedule in schedules:
+            account = accounts.get(schedule['account_id'])
+            to_post, skipped, next_run_date = plan_schedule_runs(schedule, account, now)
+            for run_date in to_post:
+                balance_before = account['balance'] + account_updates.get(account['id'], 0)
+                account_updates[account['id']] = account_updates.get(account['id'], 0) + schedule['amount']
+                transactions.append(Transaction(
+                    reference="",
+                    account_id=account['id'],
+                    member_id=account['member_id'],
+                    branch_id=account['branch_id'],
+                    transaction_type=TransactionType.DEPOSITO,
+                    amount=schedule['amount'],
+                    balance_before=balance_before,
+                    balance_after=balance_before + schedule['amount'],
+                    description=f"Depósito programado {run_date.strftime('%Y-%m-%d')}",
+                    created_by="SYSTEM",
+                    schedule_id=schedule['id']
+                ))
+            
+            update_data = {"next_run_date": next_run_date, "last_run_at": now}
+            if skipped:
+                skipped_logs.append(AuditLog(
+                    user_id="SYSTEM",
+                    action="SKIP_SCHEDULED_DEPOSITS",
+                    entity_type="DepositSchedule",
+                    entity_id=schedule['id'],
+                    new_data={
+                        "account_id": schedule['account_id'],
+                        "amount": schedule['amount'],
+                        "runs": [{"run_date": run_date, "reason": reason} for run_date, reason in skipped]
+                    },
+                    ip_address="127.0.0.1"
+                ).dict())
+            if not account:
+                # The account is gone, so every future run would be skipped as well
+                update_data["is_active"] = False
+            schedule_updates.append(UpdateOne(
+                {"id": schedule['id'], "branch_id": schedule['branch_id'], "next_run_date": schedule['next_run_date']},
+                {"$set": update_data}
+            ))
+        
+        result = await db.deposit_schedules.bulk_write(schedule_updates, ordered=False, session=session)
+        if result.matched_count != len(schedule_updates):
+            # Another worker advanced some of these schedules; abort rather than double post
+            raise RuntimeError("Deposit schedules changed during run")
+        if transactions:
+            # A retried attempt starts again from the first reserved reference
+            references = {branch_id: iter(branch_references) for branch_id, branch_references in reserved.items()}
+            for transaction in transactions:
+                transaction.reference = next(references[transaction.branch_id])
+            await db.transactions.insert_many([transaction.dict() for transaction in transactions], session=session)
+            await db.accounts.bulk_write(
+                [
+                    UpdateOne({"id": account_id, "branch_id": accounts[account_id]['branch_id']}, {"$inc": {"balance": amount}})
+                    for account_id, amount in account_updates.items()
+                ],
+                ordered=False,
+                session=session
+            )
+        if skipped_logs:
+            await db.audit_logs.insert_many(skipped_logs, session=session)
+        return len(transactions), sum(len(log['new_data']['runs']) for log in skipped_logs)
+    
+    async with await client.start_session() as session:
+        posted, skipped = await session.with_transaction(run)
+    if posted:
+        await bump_collection_version("accounts")
+    return posted, skipped
+
+async def run_due_deposit_schedules():
+    if not await acquire_job_lock("deposit_schedules", DEPOSIT_SCHEDULE_LOCK_SECONDS):
+        return None
+    
+    try:
+        now = datetime.now(timezone.utc)
+        posted = 0
+        skipped = 0
+        processed = 0
+        # Each batch advances next_run_date past now, so re-querying always yields the next unprocessed batch
+        while True:
+            schedules = await db.deposit_schedules.find(
+                {"is_active": True, "next_run_date": {"$lte": now}}
+            ).sort("next_run_date", 1).limit(DEPOSIT_SCHEDULE_BATCH_SIZE).to_list(DEPOSIT_SCHEDULE_BATCH_SIZE)
+            if not schedules:
+                break
+            batch_posted, batch_skipped = await post_deposit_schedule_batch(schedules, now)
+            posted += batch_posted
+            skipped += batch_skipped
+            processed += len(schedules)
+            if not await acquire_job_lock("deposit_schedules", DEPOSIT_SCHEDULE_LOCK_SECONDS):
+                logger.warning("Deposit schedule lease lost, stopping run")
+                break
+        
+        if processed:
+            await log_action("SYSTEM", "RUN_DEPOSIT_SCHEDULES", "DepositSchedule", "BATCH", new_data={"schedules": processed, "deposits": posted, "skipped": skipped})
+            logger.info(f"Deposit schedules run: {processed} schedules, {posted} deposits posted, {skipped} runs skipped")
+            if skipped:
+                logger.warning(f"{skipped} scheduled deposit runs skipped; see SKIP_SCHEDULED_DEPOSITS audit entries")
+        return {"schedules": processed, "deposits": posted, "skipped": skipped}
+    finally:
+        await release_job_lock("deposit_schedules")
+
+async def deposit_scheduler_loop():
+    while True:
+        try:
+            await run_due_deposit_schedules()
+        except Exception:
+            logger.exception("Deposit schedule run failed")
+        await asyncio.sleep(DEPOSIT_SCHEDULER_INTERVAL_SECONDS)
+
+@api_router.post("/deposit-schedules", response_model=DepositSchedule)
+async def create_deposit_schedule(schedule: DepositScheduleCreate, current_user: User = Depends(get_current_user)):
+    if current_user.role not in [UserRole.ADMIN, UserRole.CAJERO]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    
+    account = await db.accounts.find_one({"id": schedule.account_id, **branch_scope(current_user)})
+    if not account:
+        raise HTTPException(status_code=404, detail="Account not found")
+    if account['account_type'] != AccountType.PROGRAMADO:
+        raise HTTPException(status_code=400, detail="Deposit schedules are only available for PROGRAMADO accounts")
+    
+    schedule_obj = DepositSchedule(
+        account_id=schedule.account_id,
+        member_id=account['member_id'],
+        branch_id=account['branch_id'],
+        amount=schedule.amount,
+        day_of_month=schedule.day_of_month,
+        next_run_date=first_run_date(schedule.day_of_month),
+        created_by=current_user.id
+    )
+    
+    await db.deposit_schedules.insert_one(schedule_obj.dict())
+    await log_action(current_user.id, "CREATE_DEPOSIT_SCHEDULE", "DepositSchedule", schedule_obj.id)
+    
+    return schedule_obj
+
+@api_router.get("/deposit-schedules", response_model=List[DepositSchedule])
+async def get_deposit_schedules(account_id: Optional[str] = None, skip: int = 0, limit: int = 100, current_user: User = Depends(get_current_user)):
+    query = branch_scope(current_user)
+    if account_id:
+        query["account_id"] = account_id
+    
+    schedules = await db.deposit_schedules.find(query).sort("next_run_date", 1).skip(skip).limit(limit).to_list(limit)
+    return [DepositSchedule(**schedule) for schedule in schedules]
+
+@api_router.put("/deposit-schedules/{schedule_id}/deactivate")
+async def deactivate_deposit_schedule(schedule_id: str, current_user: User = Depends(get_current_user)):
+    if current_user.role not in [UserRole.ADMIN, UserRole.CAJERO]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    
+    result = await db.deposit_schedules.update_one({"id": schedule_id, **branch_scope(current_user)}, {"$set": {"is_active": False}})
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Deposit schedule not found")
+    
+    await log_action(current_user.id, "DEACTIVATE_DEPOSIT_SCHEDULE", "DepositSchedule", schedule_id)
+    return {"message": "Deposit schedule deactivated"}
+
+@api_router.post("/deposit-schedules/run")
+async def trigger_deposit_schedules(current_user: User = Depends(get_current_user)):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    
+    result = await run_due_deposit_schedules()
+    if result is None:
+        raise HTTPException(status_code=409, detail="Deposit schedule run already in progress")
+    return result
+
+# Reports
+REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', '2'))
+REPORT_OPEN_PERIOD_CACHE_SECONDS = 300
+REPORT_JOB_TIMEOUT_SECONDS = 900
+REPORT_POLL_SECONDS = 5
+REPORT_RESULT_TTL_SECONDS = 7 * 24 * 3600
+report_jobs_available = asyncio.Event()
+
+def report_params_hash(report: ReportJobCreate):
+    params = {"report_type": report.report_type, "branch_id": report.branch_id, "date_from": report.date_from, "date_to": report.date_to}
+    return hashlib.sha256(json.dumps(params, default=str, sort_keys=True).encode()).hexdigest()
+
+def is_closed_period(report: ReportJobCreate):
+    # Balances are a live snapshot; only date bounded reports over past days are immutable
+    if report.report_type == ReportType.AHORROS_POR_TIPO_CUENTA or report.date_to is None:
+        return False
+    today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    date_to = report.date_to if report.date_to.tzinfo else report.date_to.replace(tzinfo=timezone.utc)
+    return date_to <= today_start
+
+def report_match(field: Optional[str], job: dict):
+    match = {"branch_id": job['branch_id']} if job.get('branch_id') else {}
+    date_range = {}
+    if field and job.get('date_from'):
+        date_range["$gte"] = job['date_from']
+    if field and job.get('date_to'):
+        date_range["$lt"] = job['date_to']
+    if date_range:
+        match[field] = date_range
+    return match
+
+async def build_report(job: dict):
+    if job['report_type'] == ReportType.AHORROS_POR_TIPO_CUENTA:
+        rows = await db.accounts.aggregate([
+            {"$match": report_match(None, job)},
+            {"$group": {"_id": "$account_type", "accounts": {"$sum": 1}, "total_balance": {"$sum": "$balance"}}},
+            {"$sort": {"_id": 1}}
+        ]).to_list(None)
+        return {"rows": [{"account_type": row['_id'], "accounts": row['accounts'], "total_balance": row['total_balance']} for row in rows]}
+    
+    if job['report_type'] == ReportType.TRANSACCIONES_POR_CAJERO:
+        rows = await db.transactions.aggregate([
+            {"$match": report_match("created_at", job)},
+            {"$group": {
+                "_id": {"created_by": "$created_by", "transaction_type": "$transaction_type"},
+                "count": {"$sum": 1},
+                "total_amount": {"$sum": "$amount"}
+            }},
+            {"$sort": {"_id.created_by": 1, "_id.transaction_type": 1}}
+        ]).to_list(None)
+        user_ids = list({row['_id']['created_by'] for row in rows})
+        users = {user['id']: user['username'] for user in await db.users.find({"id": {"$in": user_ids}}, {"id": 1, "username": 1}).to_list(None)}
+        return {"rows": [
+            {
+                "created_by": row['_id']['created_by'],
+                "username": users.get(row['_id']['created_by']),
+                "transaction_type": row['_id']['transaction_type'],
+                "count": row['count'],
+                "total_amount": row['total_amount']
+            }
+            for row in rows
+        ]}
+    
+    rows = await db.members.aggregate([
+        {"$match": report_match("registration_date", job)},
+        {"$group": {"_id": {"year": {"$year": "$registration_date"}, "month": {"$month": "$registration_date"}}, "new_members": {"$sum": 1}}},
+        {"$sort": {"_id.year": 1, "_id.month": 1}}
+    ]).to_list(None)
+    return {"rows": [{"year": row['_id']['year'], "month": row['_id']['month'], "new_members": row['new_members']} for row in rows]}
+
+async def claim_report_job():
+    now = datetime.now(timezone.utc)
+    # Jobs left EN_PROCESO by a crashed worker are picked up again after the timeout
+    return await db.report_jobs.find_one_and_update(
+        {"$or": [
+            {"status": ReportJobStatus.PENDIENTE},
+            {"status": ReportJobStatus.EN_PROCESO, "started_at": {"$lt": now - timedelta(seconds=REPORT_JOB_TIMEOUT_SECONDS)}}
+        ]},
+        {"$set": {"status": ReportJobStatus.EN_PROCESO, "started_at": now}},
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def run_report_job(job: dict):
+    try:
+        result = await build_report(job)
+        update_data = {"status": ReportJobStatus.COMPLETADO, "result": result}
+    except Exception as e:
+        logger.exception(f"Report job {job['id']} failed")
+        update_data = {"status": ReportJobStatus.FALLIDO, "error": str(e)}
+    update_data["finished_at"] = datetime.now(timezone.utc)
+    await db.report_jobs.update_one({"id": job['id']}, {"$set": update_data})
+
+async def report_worker():
+    while True:
+        try:
+            job = await claim_report_job()
+            if job is None:
+                report_jobs_available.clear()
+                try:
+                    await asyncio.wait_for(report_jobs_available.wait(), REPORT_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await run_report_job(job)
+        except Exception:
+            # A job left EN_PROCESO here is reclaimed once REPORT_JOB_TIMEOUT_SECONDS passes
+            logger.exception("Report worker iteration failed")
+            await asyncio.sleep(REPORT_POLL_SECONDS)
+
+@api_router.post("/reports", response_model=ReportJob)
+async def create_report(report: ReportJobCreate, current_user: User = Depends(get_current_user)):
+    if current_user.role not in [UserRole.ADMIN, UserRole.SUPERVISOR, UserRole.AUDITOR]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    
+    if current_user.branch_id:
+        report.branch_id = current_user.branch_id
+    params_hash = report_params_hash(report)
+    cache_query = {"params_hash": params_hash, "status": ReportJobStatus.COMPLETADO}
+    if not is_closed_period(report):
+        cache_query["finished_at"] = {"$gte": datetime.now(timezone.utc) - timedelta(seconds=REPORT_OPEN_PERIOD_CACHE_SECONDS)}
+    cached = await db.report_jobs.find_one(cache_query, sort=[("finished_at", -1)])
+    if cached:
+        return ReportJob(**{**cached, "cached": True})
+    
+    # Identical request already queued or running: share it instead of computing twice
+    in_flight = await db.report_jobs.find_one({"params_hash": params_hash, "status": {"$in": [ReportJobStatus.PENDIENTE, ReportJobStatus.EN_PROCESO]}})
+    if in_flight:
+        return ReportJob(**in_flight)
+    
+    job = ReportJob(**report.dict(), params_hash=params_hash, requested_by=current_user.id)
+    try:
+        await db.report_jobs.insert_one(job.dict())
+    except DuplicateKeyError:
+        # A concurrent identical request queued first; the partial unique index on params_hash
+        # allows a single job in flight, so hand that one back
+        existing = await db.report_jobs.find_one({"params_hash": params_hash}, sort=[("created_at", -1)])
+        return ReportJob(**existing)
+    report_jobs_available.set()
+    await log_action(current_user.id, "CREATE_REPORT", "ReportJob", job.id)
+    
+    return job
+
+@api_router.get("/reports/{job_id}", response_model=ReportJob)
+async def get_report(job_id: str, current_user: User = Depends(get_current_user)):
+    if current_user.role not in [UserRole.ADMIN, UserRole.SUPERVISOR, UserRole.AUDITOR]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    
+    job = await db.report_jobs.find_one({"id": job_id, **branch_scope(current_user)})
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return ReportJob(**job)
+
 # Mutual Aid endpoints
 @api_router.post("/mutual-aid/contributions")
 async def create_contribution(member_id: str, amount: float, current_user: User = Depends(get_current_user)):
@@ -544,7 +1761,7 @@ async def create_contribution(member_id: str, amount: float, current_user: User
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
     # Verify member exists
-    member = await db.members.find_one({"id": member_id})
+    member = await db.members.find_one({"id": member_id, **branch_scope(current_user)})
     if not member:
         raise HTTPException(status_code=404, detail="Member not found")
     
@@ -567,7 +1784,7 @@ async def create_aid_request(request: AidRequestCreate, current_user: User = Dep
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
     # Verify member exists and has 6 months minimum
-    member = await db.members.find_one({"id": request.member_id})
+    member = await db.members.find_one({"id": request.member_id, **branch_scope(current_user)})
     if not member:
         raise HTTPException(status_code=404, detail="Member not found")
     
@@ -583,39 +1800,95 @@ async def create_aid_request(request: AidRequestCreate, current_user: User = Dep
     )
     
     await db.aid_requests.insert_one(aid_request.dict())
+    await bump_collection_version("aid_requests")
     await log_action(current_user.id, "CREATE_AID_REQUEST", "AidRequest", aid_request.id)
     
     return aid_request
 
-@api_router.put("/mutual-aid/requests/{request_id}/approve")
-async def approve_aid_request(request_id: str, notes: Optional[str] = None, current_user: User = Depends(get_current_user)):
-    if current_user.role not in [UserRole.ADMIN, UserRole.SUPERVISOR]:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
+async def decide_aid_request(request_id: str, update_data: dict):
+    # Conditional on PENDIENTE so concurrent supervisors cannot both decide the same request
+    aid_request = await db.aid_requests.find_one_and_update(
+        {"id": request_id, "status": AidRequestStatus.PENDIENTE},
+        {"$set": update_data},
+        return_document=ReturnDocument.AFTER
+    )
+    if aid_request:
+        await bump_collection_version("aid_requests")
+        return aid_request
     
-    aid_request = await db.aid_requests.find_one({"id": request_id})
-    if not aid_request:
+    if not await db.aid_requests.find_one({"id": request_id}, {"_id": 1}):
         raise HTTPException(status_code=404, detail="Aid request not found")
+    raise HTTPException(status_code=409, detail="Aid request already processed")
+
+async def decide_aid_requests(request_ids: List[str], update_data: dict, action: str, current_user: User):
+    decision_id = str(uuid.uuid4())
+    await db.aid_requests.update_many(
+        {"id": {"$in": request_ids}, "status": AidRequestStatus.PENDIENTE},
+        {"$set": {**update_data, "decision_id": decision_id}}
+    )
+    decided = await db.aid_requests.find({"id": {"$in": request_ids}, "decision_id": decision_id}, {"id": 1}).to_list(None)
+    processed = [aid_request['id'] for aid_request in decided]
+    
+    if processed:
+        await bump_collection_version("aid_requests")
+        await db.audit_logs.insert_many([
+            AuditLog(user_id=current_user.id, action=action, entity_type="AidRequest", entity_id=request_id, ip_address="127.0.0.1").dict()
+            for request_id in processed
+        ])
     
-    update_data = {
+    processed_ids = set(processed)
+    return {"processed": processed, "skipped": [request_id for request_id in request_ids if request_id not in processed_ids]}
+
+def approval_update(notes: Optional[str], current_user: User):
+    return {
         "status": AidRequestStatus.APROBADA,
         "approved_by": current_user.id,
         "approved_at": datetime.now(timezone.utc),
         "notes": notes
     }
+
+def rejection_update(notes: Optional[str], current_user: User):
+    return {
+        "status": AidRequestStatus.RECHAZADA,
+        "approved_by": current_user.id,
+        "approved_at": datetime.now(timezone.utc),
+        "notes": notes or "Solicitud rechazada"
+    }
+
+@api_router.put("/mutual-aid/requests/bulk/approve")
+async def bulk_approve_aid_requests(decision: AidRequestBulkDecision, current_user: User = Depends(get_current_user)):
+    if current_user.role not in [UserRole.ADMIN, UserRole.SUPERVISOR]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    
+    return await decide_aid_requests(decision.request_ids, approval_update(decision.notes, current_user), "APPROVE_AID_REQUEST", current_user)
+
+@api_router.put("/mutual-aid/requests/bulk/reject")
+async def bulk_reject_aid_requests(decision: AidRequestBulkDecision, current_user: User = Depends(get_current_user)):
+    if current_user.role not in [UserRole.ADMIN, UserRole.SUPERVISOR]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    await db.aid_requests.update_one({"id": request_id}, {"$set": update_data})
+    return await decide_aid_requests(decision.request_ids, rejection_update(decision.notes, current_user), "REJECT_AID_REQUEST", current_user)
+
+@api_router.put("/mutual-aid/requests/{request_id}/approve")
+async def approve_aid_request(request_id: str, notes: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    if current_user.role not in [UserRole.ADMIN, UserRole.SUPERVISOR]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    
+    await decide_aid_request(request_id, approval_update(notes, current_user))
     await log_action(current_user.id, "APPROVE_AID_REQUEST", "AidRequest", request_id)
     
     return {"message": "Aid request approved"}
 
 # Dashboard endpoints
 @api_router.get("/dashboard/stats")
-async def get_dashboard_stats(current_user: User = Depends(get_current_user)):
-    total_members = await db.members.count_documents({"status": MemberStatus.ACTIVO})
-    total_accounts = await db.accounts.count_documents({})
+async def get_dashboard_stats(branch_id: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    scope = branch_scope(current_user, branch_id)
+    total_members = await db.members.count_documents({**scope, "status": MemberStatus.ACTIVO})
+    total_accounts = await db.accounts.count_documents(scope)
     
     # Calculate total savings
     pipeline = [
+        {"$match": scope},
         {"$group": {"_id": None, "total_balance": {"$sum": "$balance"}}}
     ]
     total_savings_result = await db.accounts.aggregate(pipeline).to_list(1)
@@ -624,6 +1897,7 @@ async def get_dashboard_stats(current_user: User = Depends(get_current_user)):
     # Today's transactions
     today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
     today_transactions = await db.transactions.count_documents({
+        **scope,
         "created_at": {"$gte": today_start}
     })
     
@@ -640,16 +1914,27 @@ async def get_audit_logs(skip: int = 0, limit: int = 100, current_user: User = D
     if current_user.role not in [UserRole.ADMIN, UserRole.AUDITOR]:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    logs = await db.audit_logs.find().sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
+    # Audit entries carry no branch; a branch-bound reviewer sees what its branch's users did
+    query = {}
+    if current_user.branch_id:
+        branch_users = await db.users.find({"branch_id": current_user.branch_id}, {"id": 1}).to_list(None)
+        query["user_id"] = {"$in": [user['id'] for user in branch_users]}
+    
+    logs = await db.audit_logs.find(query).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
     return [AuditLog(**log) for log in logs]
 
 # Users endpoints
 @api_router.get("/users", response_model=List[User])
-async def get_users(current_user: User = Depends(get_current_user)):
+async def get_users(request: Request, response: Response, current_user: User = Depends(get_current_user)):
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    users = await db.users.find().to_list(1000)
+    scope = branch_scope(current_user)
+    not_modified = await check_etag(request, response, "users", scope)
+    if not_modified:
+        return not_modified
+    
+    users = await db.users.find(scope).to_list(1000)
     return [User(**user) for user in users]
 
 # Notifications endpoints
@@ -714,30 +1999,55 @@ async def broadcast_notification(title: str, message: str, notification_type: No
 
 # Mutual Aid Requests endpoints
 @api_router.get("/mutual-aid/requests", response_model=List[AidRequest])
-async def get_aid_requests(current_user: User = Depends(get_current_user)):
+async def get_aid_requests(
+    request: Request,
+    response: Response,
+    status: Optional[AidRequestStatus] = None,
+    before_requested_at: Optional[datetime] = None,
+    before_id: Optional[str] = None,
+    limit: int = 100,
+    current_user: User = Depends(get_current_user)
+):
     if current_user.role not in [UserRole.ADMIN, UserRole.SUPERVISOR]:
         raise HTTPException(status_code=403, detail="Not enough permissions")
+    limit = max(1, min(limit, 500))
+    if (before_requested_at is None) != (before_id is None):
+        raise HTTPException(status_code=400, detail="before_requested_at and before_id must be given together")
+    
+    not_modified = await check_etag(request, response, "aid_requests", status, before_requested_at, before_id, limit)
+    if not_modified:
+        return not_modified
     
-    requests = await db.aid_requests.find().sort("requested_at", -1).to_list(1000)
+    # Keyset paging on (requested_at, id): pass the last row of a page to get the next one
+    query = {}
+    if status:
+        query["status"] = status
+    if before_requested_at:
+        query["$or"] = [
+            {"requested_at": {"$lt": before_requested_at}},
+            {"requested_at": before_requested_at, "id": {"$lt": before_id}}
+        ]
+    
+    requests = await db.aid_requests.find(query).sort([("requested_at", -1), ("id", -1)]).limit(limit).to_list(limit)
     return [AidRequest(**request) for request in requests]
 
-@api_router.put("/mutual-aid/requests/{request_id}/reject")
-async def reject_aid_request(request_id: str, notes: Optional[str] = None, current_user: User = Depends(get_current_user)):
+@api_router.get("/mutual-aid/requests/counts")
+async def get_aid_request_counts(current_user: User = Depends(get_current_user)):
     if current_user.role not in [UserRole.ADMIN, UserRole.SUPERVISOR]:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    aid_request = await db.aid_requests.find_one({"id": request_id})
-    if not aid_request:
-        raise HTTPException(status_code=404, detail="Aid request not found")
-    
-    update_data = {
-        "status": AidRequestStatus.RECHAZADA,
-        "approved_by": current_user.id,
-        "approved_at": datetime.now(timezone.utc),
-        "notes": notes or "Solicitud rechazada"
+    # One COUNT_SCAN per status on the (status, requested_at, id) index
+    return {
+        aid_status.value: await db.aid_requests.count_documents({"status": aid_status})
+        for aid_status in AidRequestStatus
     }
+
+@api_router.put("/mutual-aid/requests/{request_id}/reject")
+async def reject_aid_request(request_id: str, notes: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    if current_user.role not in [UserRole.ADMIN, UserRole.SUPERVISOR]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    await db.aid_requests.update_one({"id": request_id}, {"$set": update_data})
+    await decide_aid_request(request_id, rejection_update(notes, current_user))
     await log_action(current_user.id, "REJECT_AID_REQUEST", "AidRequest", request_id)
     
     return {"message": "Aid request rejected"}
@@ -751,6 +2061,224 @@ async def root():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now(timezone.utc)}
 
+# Load shedding
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True, 0.0
+        return False, (1 - self.tokens) / self.rate
+
+class RouteClass(BaseModel):
+    name: str
+    priority: int
+    max_concurrency: int
+    max_queue: int
+    queue_timeout: float
+
+class ConcurrencyLimiter:
+    """Shared pool of request slots handed out by route class priority.
+
+    Each class is also capped on its own so low priority work (reports) can
+    never hold every slot, and waiting requests of a higher priority class are
+    always woken first when a slot frees up.
+    """
+
+    def __init__(self, limit: int, route_classes: List[RouteClass]):
+        self.limit = limit
+        self.route_classes = sorted(route_classes, key=lambda route_class: route_class.priority)
+        self.classes = {route_class.name: route_class for route_class in route_classes}
+        self.active = 0
+        self.class_active = {route_class.name: 0 for route_class in route_classes}
+        self.waiters = {route_class.name: deque() for route_class in route_classes}
+        self.rejected = {route_class.name: 0 for route_class in route_classes}
+
+    def _can_run(self, route_class: RouteClass):
+        return self.active < self.limit and self.class_active[route_class.name] < route_class.max_concurrency
+
+    def _has_waiters_ahead(self, route_class: RouteClass):
+        return any(
+            any(not waiter.done() for waiter in self.waiters[other.name])
+            for other in self.route_classes
+            if other.priority <= route_class.priority
+        )
+
+    def _grant(self, route_class: RouteClass):
+        self.active += 1
+        self.class_active[route_class.name] += 1
+
+    def _wake(self):
+        for route_class in self.route_classes:
+            waiters = self.waiters[route_class.name]
+            while waiters and self._can_run(route_class):
+                waiter = waiters.popleft()
+                if waiter.done():
+                    continue
+                self._grant(route_class)
+                waiter.set_result(True)
+
+    async def acquire(self, name: str):
+        route_class = self.classes[name]
+        if self._can_run(route_class) and not self._has_waiters_ahead(route_class):
+            self._grant(route_class)
+            return True
+        
+        waiters = self.waiters[name]
+        if len(waiters) >= route_class.max_queue:
+            self.rejected[name] += 1
+            return False
+        
+        waiter = asyncio.get_running_loop().create_future()
+        waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, route_class.queue_timeout)
+        except asyncio.TimeoutError:
+            self._abandon(name, waiter)
+            self.rejected[name] += 1
+            return False
+        except asyncio.CancelledError:
+            self._abandon(name, waiter)
+            raise
+        return True
+
+    def _abandon(self, name: str, waiter):
+        if waiter.done() and not waiter.cancelled():
+            # Slot was granted just as the caller gave up on it
+            self.release(name)
+        elif waiter in self.waiters[name]:
+            self.waiters[name].remove(waiter)
+
+    def release(self, name: str):
+        self.active -= 1
+        self.class_active[name] -= 1
+        self._wake()
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "classes": {
+                route_class.name: {
+                    "priority": route_class.priority,
+                    "active": self.class_active[route_class.name],
+                    "max_concurrency": route_class.max_concurrency,
+                    "queue_depth": sum(1 for waiter in self.waiters[route_class.name] if not waiter.done()),
+                    "rejected": self.rejected[route_class.name]
+                }
+                for route_class in self.route_classes
+            }
+        }
+
+MAX_CONCURRENT_REQUESTS = int(os.environ.get('MAX_CONCURRENT_REQUESTS', '64'))
+RETRY_AFTER_SECONDS = 1
+
+# (requests per second, burst) per role; unauthenticated callers are keyed by IP
+RATE_LIMITS = {
+    UserRole.ADMIN: (20.0, 60),
+    UserRole.SUPERVISOR: (10.0, 30),
+    UserRole.CAJERO: (20.0, 60),
+    UserRole.AUDITOR: (5.0, 20)
+}
+# Tokens issued before the role claim existed
+DEFAULT_USER_RATE_LIMIT = (20.0, 60)
+ANONYMOUS_RATE_LIMIT = (5.0, 10)
+MAX_RATE_BUCKETS = 10000
+# Number of reverse proxies in front of the app that append to X-Forwarded-For; 0 trusts none
+FORWARDED_PROXY_HOPS = int(os.environ.get('FORWARDED_PROXY_HOPS', '0'))
+
+TELLER_WRITE_PATHS = ("/api/transactions", "/api/transfers", "/api/members", "/api/accounts", "/api/mutual-aid/contributions", "/api/sync")
+REPORTING_PATHS = ("/api/dashboard", "/api/audit-logs", "/api/reports")
+RATE_LIMIT_EXEMPT_PATHS = ("/api/health",)
+
+concurrency_limiter = ConcurrencyLimiter(MAX_CONCURRENT_REQUESTS, [
+    RouteClass(name="teller", priority=0, max_concurrency=MAX_CONCURRENT_REQUESTS, max_queue=200, queue_timeout=10.0),
+    RouteClass(name="default", priority=1, max_concurrency=MAX_CONCURRENT_REQUESTS, max_queue=100, queue_timeout=5.0),
+    RouteClass(name="reporting", priority=2, max_concurrency=max(1, MAX_CONCURRENT_REQUESTS // 8), max_queue=50, queue_timeout=15.0)
+])
+rate_buckets: Dict[str, TokenBucket] = {}
+
+def classify_request(method: str, path: str):
+    if method != "GET" and path.startswith(TELLER_WRITE_PATHS):
+        return "teller"
+    if path.startswith(REPORTING_PATHS) or (method == "GET" and path.startswith("/api/transactions")):
+        return "reporting"
+    return "default"
+
+def client_address(request):
+    if FORWARDED_PROXY_HOPS:
+        # Each trusted proxy appends the address it saw; anything further left is client supplied
+        forwarded = [address.strip() for address in request.headers.get("x-forwarded-for", "").split(",") if address.strip()]
+        if len(forwarded) >= FORWARDED_PROXY_HOPS:
+            return forwarded[-FORWARDED_PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
+
+def rate_limit_identity(request):
+    # Signature check only; the user lookup stays in get_current_user
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        try:
+            payload = jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM])
+        except jwt.PyJWTError:
+            payload = {}
+        if payload.get("sub"):
+            return f"user:{payload['sub']}", RATE_LIMITS.get(payload.get("role"), DEFAULT_USER_RATE_LIMIT)
+    return f"ip:{client_address(request)}", ANONYMOUS_RATE_LIMIT
+
+def take_rate_token(key: str, limits: tuple):
+    bucket = rate_buckets.get(key)
+    if bucket is None:
+        if len(rate_buckets) >= MAX_RATE_BUCKETS:
+            # Idle buckets have refilled completely, so dropping them loses nothing
+            now = time.monotonic()
+            for idle_key in [k for k, b in rate_buckets.items() if b.tokens + (now - b.updated) * b.rate >= b.capacity]:
+                del rate_buckets[idle_key]
+        rate, burst = limits
+        bucket = rate_buckets[key] = TokenBucket(rate, burst)
+    return bucket.take()
+
+@app.middleware("http")
+async def load_shedding_middleware(request, call_next):
+    path = request.url.path
+    if request.method == "OPTIONS" or not path.startswith("/api") or path.startswith(RATE_LIMIT_EXEMPT_PATHS):
+        return await call_next(request)
+    
+    key, limits = rate_limit_identity(request)
+    allowed, retry_after = take_rate_token(key, limits)
+    if not allowed:
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "Rate limit exceeded"},
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+    
+    route_class = classify_request(request.method, path)
+    if not await concurrency_limiter.acquire(route_class):
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Server busy, try again later"},
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+        )
+    try:
+        return await call_next(request)
+    finally:
+        concurrency_limiter.release(route_class)
+
+@api_router.get("/metrics/load")
+async def get_load_metrics(current_user: User = Depends(get_current_user)):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    
+    return {**concurrency_limiter.stats(), "rate_limited_identities": len(rate_buckets)}
+
 # Include router
 app.include_router(api_router)
 
@@ -761,8 +2289,11 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Retry-After"],
 )
 
+app.add_middleware(GZipMiddleware, minimum_size=int(os.environ.get('GZIP_MINIMUM_SIZE', '1000')))
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -770,8 +2301,49 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def ensure_branch_layout():
+    if not await db.branches.find_one({"id": DEFAULT_BRANCH_ID}):
+        await db.branches.insert_one(Branch(id=DEFAULT_BRANCH_ID, name="Oficina Principal").dict())
+    
+    # Records created before branches existed belong to the default branch
+    backfills = [
+        (db.members, {}),
+        (db.accounts, {}),
+        (db.transactions, {}),
+        (db.deposit_schedules, {}),
+        (db.users, {"role": {"$ne": UserRole.ADMIN}})
+    ]
+    for collection, query in backfills:
+        result = await collection.update_many({**query, "branch_id": {"$exists": False}}, {"$set": {"branch_id": DEFAULT_BRANCH_ID}})
+        if result.modified_count:
+            # Cached list bodies from before the backfill lack branch_id
+            await bump_collection_version(collection.name)
+    
+    # Every index leads with branch_id; (branch_id, id) is the intended shard key
+    await db.branches.create_index("id", unique=True)
+    await db.users.create_index("username")
+    await db.users.create_index([("branch_id", 1), ("id", 1)])
+    await db.members.create_index("id")
+    await db.members.create_index([("branch_id", 1), ("id", 1)])
+    await db.members.create_index([("branch_id", 1), ("status", 1)])
+    await db.members.create_index([("branch_id", 1), ("member_number", 1)])
+    await db.accounts.create_index("id")
+    await db.accounts.create_index([("branch_id", 1), ("id", 1)])
+    await db.accounts.create_index([("branch_id", 1), ("member_id", 1), ("account_type", 1)])
+    await db.transactions.create_index([("branch_id", 1), ("id", 1)])
+    await db.transactions.create_index([("branch_id", 1), ("created_at", -1)])
+    await db.transactions.create_index([("branch_id", 1), ("account_id", 1), ("created_at", -1)])
+    await db.sync_operations.create_index([("terminal_id", 1), ("client_op_id", 1)], unique=True)
+    await db.audit_logs.create_index([("user_id", 1), ("created_at", -1)])
+    
+    # Tokens from the per-process consumer ids that predate worker slots can never be resumed
+    await db.event_bus_tokens.delete_many({"slot": {"$exists": False}})
+    await db.event_bus_tokens.create_index([("host", 1), ("slot", 1)])
+
 @app.on_event("startup")
 async def startup_event():
+    await ensure_branch_layout()
+    
     # Create default admin user if not exists
     admin_user = await db.users.find_one({"username": "admin"})
     if not admin_user:
@@ -786,8 +2358,37 @@ async def startup_event():
             "password": get_password_hash("admin123")
         }
         await db.users.insert_one(default_admin)
+        await bump_collection_version("users")
         logger.info("Default admin user created")
+    
+    await db.deposit_schedules.create_index([("is_active", 1), ("next_run_date", 1)])
+    await db.deposit_schedules.create_index([("branch_id", 1), ("account_id", 1)])
+    app.state.deposit_scheduler = asyncio.create_task(deposit_scheduler_loop())
+    app.state.event_bus = asyncio.create_task(event_bus_loop())
+    
+    await db.report_jobs.create_index("id", unique=True)
+    await db.report_jobs.create_index([("params_hash", 1), ("status", 1), ("finished_at", -1)])
+    await db.report_jobs.create_index(
+        "params_hash",
+        name="params_hash_in_flight",
+        unique=True,
+        partialFilterExpression={"status": {"$in": [ReportJobStatus.PENDIENTE, ReportJobStatus.EN_PROCESO]}}
+    )
+    # Finished jobs and their stored results expire; pending jobs have no finished_at yet
+    await db.report_jobs.create_index("finished_at", expireAfterSeconds=REPORT_RESULT_TTL_SECONDS)
+    await db.report_jobs.create_index([("status", 1), ("created_at", 1)])
+    app.state.report_workers = [asyncio.create_task(report_worker()) for _ in range(REPORT_WORKERS)]
+    
+    await db.aid_requests.create_index("id")
+    await db.aid_requests.create_index([("status", 1), ("requested_at", -1), ("id", -1)])
+    await db.aid_requests.create_index([("requested_at", -1), ("id", -1)])
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    app.state.deposit_scheduler.cancel()
+    app.state.event_bus.cancel()
+    for worker in app.state.report_workers:
+        worker.cancel()
+    # Let the event bus release its slot lease so the next start resumes it right away
+    await asyncio.gather(app.state.event_bus, return_exceptions=True)
     client.close()
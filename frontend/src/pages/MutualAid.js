@@ -1,8 +1,12 @@
 import React, { useState, useEffect } from 'react';
 import axios from '../config/api';
 
+const AID_REQUESTS_PAGE_SIZE = 100;
+
 const MutualAid = () => {
   const [aidRequests, setAidRequests] = useState([]);
+  const [statusFilter, setStatusFilter] = useState('PENDIENTE');
+  const [hasMore, setHasMore] = useState(false);
   const [members, setMembers] = useState([]);
   const [loading, setLoading] = useState(true);
   const [showRequestForm, setShowRequestForm] = useState(false);
@@ -18,14 +22,27 @@ const MutualAid = () => {
   });
 
   useEffect(() => {
-    fetchAidRequests();
     fetchMembers();
   }, []);
 
-  const fetchAidRequests = async () => {
+  useEffect(() => {
+    fetchAidRequests();
+  }, [statusFilter]);
+
+  // The endpoint pages by (requested_at, id); the last row loaded is the cursor for the next page
+  const fetchAidRequests = async (after = null) => {
     try {
-      const response = await axios.get('/mutual-aid/requests');
-      setAidRequests(response.data);
+      const params = { limit: AID_REQUESTS_PAGE_SIZE };
+      if (statusFilter) {
+        params.status = statusFilter;
+      }
+      if (after) {
+        params.before_requested_at = after.requested_at;
+        params.before_id = after.id;
+      }
+      const response = await axios.get('/mutual-aid/requests', { params });
+      setAidRequests(after ? [...aidRequests, ...response.data] : response.data);
+      setHasMore(response.data.length === AID_REQUESTS_PAGE_SIZE);
     } catch (error) {
       console.error('Error fetching aid requests:', error);
       setAidRequests([]); // Set empty array if endpoint doesn't exist yet
@@ -220,8 +237,19 @@ const MutualAid = () => {
       )}
 
       <div className="bg-white rounded-xl shadow-sm border">
-        <div className="p-6 border-b">
+        <div className="p-6 border-b flex justify-between items-center">
           <h3 className="text-lg font-medium text-gray-900">Solicitudes de Ayuda</h3>
+          <select
+            className="px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-orange-500 focus:border-transparent"
+            value={statusFilter}
+            onChange={(e) => setStatusFilter(e.target.value)}
+            data-testid="aid-requests-status-filter"
+          >
+            <option value="PENDIENTE">Pendientes</option>
+            <option value="APROBADA">Aprobadas</option>
+            <option value="RECHAZADA">Rechazadas</option>
+            <option value="">Todas</option>
+          </select>
         </div>
         
         <div className="overflow-x-auto">
@@ -295,6 +323,17 @@ const MutualAid = () => {
             </tbody>
           </table>
         </div>
+        {hasMore && (
+          <div className="p-4 border-t text-center">
+            <button
+              onClick={() => fetchAidRequests(aidRequests[aidRequests.length - 1])}
+              className="text-orange-600 hover:text-orange-900 font-medium"
+              data-testid="aid-requests-load-more"
+            >
+              Cargar más
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta, timezone
+
+from server import MAX_CATCH_UP_RUNS, add_months, first_run_date, plan_schedule_runs
+
+
+def schedule(next_run_date, day_of_month=15):
+    return {"id": "s-1", "account_id": "a-1", "day_of_month": day_of_month, "next_run_date": next_run_date, "amount": 100}
+
+
+def test_add_months_rolls_over_year_end():
+    assert add_months(datetime(2025, 12, 5), 1, 5) == datetime(2026, 1, 5)
+    assert add_months(datetime(2025, 1, 28), 13, 28) == datetime(2026, 2, 28)
+    assert add_months(datetime(2025, 11, 10), 2, 10) == datetime(2026, 1, 10)
+
+
+def test_first_run_date_is_next_occurrence_of_day():
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    for day in [1, 15, 28]:
+        run_date = first_run_date(day)
+        assert run_date.day == day
+        assert today <= run_date < today + timedelta(days=32)
+
+    if today.day <= 28:
+        assert first_run_date(today.day) == today
+
+
+def test_plan_posts_every_missed_month_up_to_now():
+    now = datetime(2026, 3, 20, tzinfo=timezone.utc)
+
+    to_post, skipped, next_run_date = plan_schedule_runs(schedule(datetime(2026, 1, 15)), {"is_blocked": False}, now)
+
+    assert to_post == [datetime(2026, m, 15, tzinfo=timezone.utc) for m in (1, 2, 3)]
+    assert skipped == []
+    assert next_run_date == datetime(2026, 4, 15, tzinfo=timezone.utc)
+
+
+def test_plan_skips_runs_beyond_catch_up_limit():
+    now = datetime(2026, 3, 20, tzinfo=timezone.utc)
+
+    to_post, skipped, next_run_date = plan_schedule_runs(schedule(datetime(2024, 1, 15)), {"is_blocked": False}, now)
+
+    assert len(to_post) == MAX_CATCH_UP_RUNS
+    assert len(to_post) + len(skipped) == 27
+    assert {reason for _, reason in skipped} == {"CATCH_UP_LIMIT"}
+    assert next_run_date == datetime(2026, 4, 15, tzinfo=timezone.utc)
+
+
+def test_plan_records_blocked_and_missing_accounts_as_skipped():
+    now = datetime(2026, 2, 20, tzinfo=timezone.utc)
+
+    _, blocked, _ = plan_schedule_runs(schedule(datetime(2026, 1, 15)), {"is_blocked": True}, now)
+    to_post, missing, _ = plan_schedule_runs(schedule(datetime(2026, 1, 15)), None, now)
+
+    assert [reason for _, reason in blocked] == ["ACCOUNT_BLOCKED", "ACCOUNT_BLOCKED"]
+    assert to_post == []
+    assert [reason for _, reason in missing] == ["ACCOUNT_NOT_FOUND", "ACCOUNT_NOT_FOUND"]
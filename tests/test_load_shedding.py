@@ -0,0 +1,113 @@
+import asyncio
+
+import jwt
+from starlette.requests import Request
+
+import server
+from server import ALGORITHM, SECRET_KEY, ConcurrencyLimiter, RouteClass, TokenBucket
+
+
+def make_request(headers=None, client=("10.0.0.1", 1234)):
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/api/members",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+        "client": client,
+    })
+
+
+def route_classes():
+    return [
+        RouteClass(name="teller", priority=0, max_concurrency=2, max_queue=5, queue_timeout=1.0),
+        RouteClass(name="reporting", priority=2, max_concurrency=1, max_queue=1, queue_timeout=0.05),
+    ]
+
+
+def test_token_bucket_allows_burst_then_refills(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: now[0])
+    bucket = TokenBucket(rate=2.0, capacity=2)
+
+    assert bucket.take() == (True, 0.0)
+    assert bucket.take() == (True, 0.0)
+    allowed, retry_after = bucket.take()
+    assert not allowed
+    assert retry_after == 0.5
+
+    now[0] += 0.5
+    assert bucket.take() == (True, 0.0)
+
+
+def test_waiting_teller_requests_go_before_reporting():
+    async def scenario():
+        limiter = ConcurrencyLimiter(1, route_classes())
+        order = []
+
+        async def run(route_class, tag):
+            if await limiter.acquire(route_class):
+                order.append(tag)
+                await asyncio.sleep(0.01)
+                limiter.release(route_class)
+
+        assert await limiter.acquire("teller")
+        waiting = [
+            asyncio.create_task(run("reporting", "report")),
+            asyncio.create_task(run("teller", "teller")),
+        ]
+        await asyncio.sleep(0)
+        limiter.release("teller")
+        await asyncio.gather(*waiting)
+        return order
+
+    assert asyncio.run(scenario()) == ["teller", "report"]
+
+
+def test_reporting_is_capped_and_sheds_when_its_queue_is_full():
+    async def scenario():
+        limiter = ConcurrencyLimiter(4, route_classes())
+        assert await limiter.acquire("reporting")
+        queued = asyncio.create_task(limiter.acquire("reporting"))
+        await asyncio.sleep(0)
+        rejected_immediately = await limiter.acquire("reporting")
+        timed_out = await queued
+        return rejected_immediately, timed_out, limiter.stats()
+
+    rejected_immediately, timed_out, stats = asyncio.run(scenario())
+
+    assert rejected_immediately is False
+    assert timed_out is False
+    assert stats["classes"]["reporting"] == {
+        "priority": 2,
+        "active": 1,
+        "max_concurrency": 1,
+        "queue_depth": 0,
+        "rejected": 2,
+    }
+
+
+def test_legacy_token_without_role_gets_per_user_limit():
+    token = jwt.encode({"sub": "cajero1"}, SECRET_KEY, algorithm=ALGORITHM)
+
+    key, limits = server.rate_limit_identity(make_request({"Authorization": f"Bearer {token}"}))
+
+    assert key == "user:cajero1"
+    assert limits == server.DEFAULT_USER_RATE_LIMIT
+
+
+def test_role_claim_selects_role_limit():
+    token = jwt.encode({"sub": "auditor1", "role": "AUDITOR"}, SECRET_KEY, algorithm=ALGORITHM)
+
+    key, limits = server.rate_limit_identity(make_request({"Authorization": f"Bearer {token}"}))
+
+    assert key == "user:auditor1"
+    assert limits == server.RATE_LIMITS[server.UserRole.AUDITOR]
+
+
+def test_anonymous_callers_keyed_by_forwarded_address_behind_proxy(monkeypatch):
+    request = make_request({"X-Forwarded-For": "203.0.113.9, 198.51.100.7"})
+
+    assert server.rate_limit_identity(request) == ("ip:10.0.0.1", server.ANONYMOUS_RATE_LIMIT)
+
+    monkeypatch.setattr(server, "FORWARDED_PROXY_HOPS", 1)
+    assert server.rate_limit_identity(request)[0] == "ip:198.51.100.7"
@@ -0,0 +1,148 @@
+from datetime import datetime, timedelta, timezone
+
+from server import (
+    MemberCreate,
+    SyncOperation,
+    SyncOperationType,
+    SyncResult,
+    SyncStatus,
+    TransactionType,
+    order_sync_results,
+    replay_account_operations,
+    screen_new_members,
+    screen_sync_operations,
+)
+
+START = datetime(2026, 10, 1, 9, 0, tzinfo=timezone.utc)
+
+
+def operation(client_op_id, op_type, minutes=0, **fields):
+    return SyncOperation(client_op_id=client_op_id, client_timestamp=START + timedelta(minutes=minutes), op_type=op_type, **fields)
+
+
+def account(account_id, balance, is_blocked=False):
+    return {"id": account_id, "member_id": "m-1", "branch_id": "MATRIZ", "balance": balance, "is_blocked": is_blocked}
+
+
+def new_member(identity_document, email):
+    return MemberCreate(
+        identity_document=identity_document,
+        first_name="Ana",
+        last_name="Perez",
+        email=email,
+        phone="555-0100",
+        address="Calle 1",
+        birth_date=datetime(1990, 1, 1),
+    )
+
+
+def test_running_balance_rejects_withdrawal_once_funds_run_out():
+    ops = [
+        operation("1", SyncOperationType.RETIRO, 0, account_id="a-1", amount=60),
+        operation("2", SyncOperationType.RETIRO, 1, account_id="a-1", amount=60),
+        operation("3", SyncOperationType.DEPOSITO, 2, account_id="a-1", amount=100),
+        operation("4", SyncOperationType.RETIRO, 3, account_id="a-1", amount=60),
+    ]
+
+    postings, conflicts, balances = replay_account_operations(ops, {"a-1": account("a-1", 100)})
+
+    assert conflicts == {"2": "Insufficient funds"}
+    assert [(posting[0].client_op_id, posting[1], posting[2], posting[3]) for posting in postings] == [
+        ("1", TransactionType.RETIRO, 100, 40),
+        ("3", TransactionType.DEPOSITO, 40, 140),
+        ("4", TransactionType.RETIRO, 140, 80),
+    ]
+    assert balances == {"a-1": 80}
+
+
+def test_balances_are_tracked_per_account():
+    ops = [
+        operation("1", SyncOperationType.RETIRO, 0, account_id="a-1", amount=50),
+        operation("2", SyncOperationType.RETIRO, 1, account_id="a-2", amount=50),
+    ]
+
+    postings, conflicts, balances = replay_account_operations(ops, {"a-1": account("a-1", 50), "a-2": account("a-2", 20)})
+
+    assert [posting[0].client_op_id for posting in postings] == ["1"]
+    assert conflicts == {"2": "Insufficient funds"}
+    assert balances == {"a-1": 0, "a-2": 20}
+
+
+def test_unknown_and_blocked_accounts_conflict():
+    ops = [
+        operation("1", SyncOperationType.DEPOSITO, 0, account_id="missing", amount=10),
+        operation("2", SyncOperationType.DEPOSITO, 1, account_id="a-1", amount=10),
+    ]
+
+    postings, conflicts, balances = replay_account_operations(ops, {"a-1": account("a-1", 0, is_blocked=True)})
+
+    assert postings == []
+    assert conflicts == {"1": "Account not found", "2": "Account is blocked"}
+    assert balances == {"a-1": 0}
+
+
+def test_operation_synced_in_an_earlier_batch_is_a_duplicate():
+    ops = [operation("1", SyncOperationType.DEPOSITO, account_id="a-1", amount=10)]
+    previous = {"1": {"client_op_id": "1", "entity_id": "t-1", "reference": "TXN-MATRIZ-20261001-000001"}}
+
+    results, pending = screen_sync_operations(ops, previous)
+
+    assert pending == []
+    assert results["1"].status == SyncStatus.DUPLICADA
+    assert results["1"].entity_id == "t-1"
+    assert results["1"].reference == "TXN-MATRIZ-20261001-000001"
+
+
+def test_operation_repeated_inside_a_batch_is_applied_once():
+    first = operation("1", SyncOperationType.DEPOSITO, 0, account_id="a-1", amount=10)
+    repeat = operation("1", SyncOperationType.DEPOSITO, 5, account_id="a-1", amount=10)
+
+    results, pending = screen_sync_operations([first, repeat], {})
+    assert pending == [first]
+
+    results["1"] = SyncResult(client_op_id="1", status=SyncStatus.APLICADA, entity_id="t-1", reference="R-1")
+    output = order_sync_results([first, repeat], results)
+
+    assert [result.status for result in output] == [SyncStatus.APLICADA, SyncStatus.DUPLICADA]
+    assert output[1].entity_id == "t-1"
+
+
+def test_non_positive_and_non_finite_amounts_conflict():
+    ops = [
+        operation("1", SyncOperationType.DEPOSITO, account_id="a-1", amount=0),
+        operation("2", SyncOperationType.APORTE_MUTUA, member_id="m-1"),
+        operation("3", SyncOperationType.DEPOSITO, account_id="a-1", amount=float("nan")),
+        operation("4", SyncOperationType.RETIRO, account_id="a-1", amount=float("inf")),
+    ]
+
+    results, pending = screen_sync_operations(ops, {})
+
+    assert pending == []
+    assert {client_op_id: result.detail for client_op_id, result in results.items()} == {
+        "1": "Amount must be a positive number",
+        "2": "Amount must be a positive number",
+        "3": "Amount must be a positive number",
+        "4": "Amount must be a positive number",
+    }
+
+
+def test_duplicate_member_identity_or_email_conflicts():
+    ops = [
+        operation("1", SyncOperationType.SOCIO, 0, member=new_member("ID-1", "existing@example.com")),
+        operation("2", SyncOperationType.SOCIO, 1, member=new_member("ID-TAKEN", "new@example.com")),
+        operation("3", SyncOperationType.SOCIO, 2, member=new_member("ID-3", "ana@example.com")),
+        operation("4", SyncOperationType.SOCIO, 3, member=new_member("ID-3", "other@example.com")),
+        operation("5", SyncOperationType.SOCIO, 4, member=new_member("ID-5", "ana@example.com")),
+        operation("6", SyncOperationType.SOCIO, 5),
+    ]
+
+    accepted, conflicts = screen_new_members(ops, {"ID-TAKEN"}, {"existing@example.com"})
+
+    assert [accepted_op.client_op_id for accepted_op in accepted] == ["3"]
+    assert conflicts == {
+        "1": "Member with this identity or email already exists",
+        "2": "Member with this identity or email already exists",
+        "4": "Member with this identity or email already exists",
+        "5": "Member with this identity or email already exists",
+        "6": "Member data missing",
+    }